@@ -7,16 +7,22 @@
 Warning: Built for use with python 3.6+
 '''
 
+from time import sleep, monotonic, perf_counter
+# taken before anything else gets imported, so that imports can be profiled as well
+IMPORT_START_TIME = perf_counter()
 import logging
 import signal
 import threading
-import asyncio
 import os
+import argparse
 from configparser import ConfigParser
-from time import sleep
-from chia import __version__ as chia_version
-from prometheus_client import start_http_server, Gauge
-from modules.chia_stats import chia_stats
+# chia itself only gets imported by the modules which need it, once they're set up
+from importlib.metadata import version, PackageNotFoundError
+from prometheus_client import start_http_server, REGISTRY
+from modules.module_worker import module_worker
+from modules.startup_profiler import startup_profile
+
+startup_profile.record('chiatter', 'imports', perf_counter() - IMPORT_START_TIME)
 
 # logging configuration block
 LOGGER_FORMAT = '%(asctime)s %(levelname)s >>> %(message)s'
@@ -29,14 +35,6 @@ logger.setLevel(logging.INFO)
 # conf file block
 CONF_FILE_PATH = os.path.join('..', 'conf', 'chiatter.conf')
 
-PLOT_BASE_KSIZE = 32
-# starts at k32 and goes up to k41 (should be enough
-# even for the k-raziest of plotters out there)
-PLOT_KSIZE_RANGE = range(10)
-# will cater for C0 to C9, although only compression
-# levels up to C7 are oficialy supported
-PLOT_COMPRESSION_LEVEL_RANGE = range(10)
-
 def sigterm_handler(signum, frame):
     logger.debug('Stopping stats collection due to SIGTERM...')
 
@@ -47,62 +45,12 @@ def sigint_handler(signum, frame):
 
     raise SystemExit(0)
 
-def chia_stats_worker(counter_lock, terminate_event, error_counter):
-
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-
-    while not terminate_event.is_set():
-        try:
-            # you'll have to excuse me here, but I simply h8 asyncio
-            loop.run_until_complete(chia_stats_inst.collect_stats())
-
-            chia_stats_harvesters.set(chia_stats_inst.harvesters)
-
-            chia_stats_duplicate_plots.set(chia_stats_inst.plots_duplicates)
-            chia_stats_failed_to_open_plots.set(chia_stats_inst.plots_failed_to_open)
-            chia_stats_no_key_plots.set(chia_stats_inst.plots_no_key)
-
-            # OG plots
-            chia_stats_og_size.set(chia_stats_inst.og_size)
-            chia_stats_og_time_to_win.set(chia_stats_inst.og_time_to_win)
-            for ksize in PLOT_KSIZE_RANGE:
-                chia_stats_og_plots[ksize].set(chia_stats_inst.plots_og[ksize])
-            # OG plots won't have a compression level
-
-            # portable plots
-            chia_stats_portable_size.set(chia_stats_inst.portable_size)
-            chia_stats_portable_time_to_win.set(chia_stats_inst.portable_time_to_win)
-            for ksize in PLOT_KSIZE_RANGE:
-                chia_stats_portable_plots[ksize].set(chia_stats_inst.plots_portable[ksize])
-            for clevel in PLOT_COMPRESSION_LEVEL_RANGE:
-                chia_stats_plots_compression_level[clevel].set(chia_stats_inst.plots_clevel[clevel])
-
-            chia_stats_sync_status.set(chia_stats_inst.sync_status)
-            chia_stats_difficulty.set(chia_stats_inst.difficulty)
-            chia_stats_current_height.set(chia_stats_inst.current_height)
-            chia_stats_chia_farmed.set(chia_stats_inst.chia_farmed)
-            chia_stats_wallet_funds.set(chia_stats_inst.wallet_funds)
-            chia_stats_network_space_size.set(chia_stats_inst.network_space_size)
-            chia_stats_mempool_size.set(chia_stats_inst.mempool_size)
-            chia_stats_mempool_allocation.set(chia_stats_inst.mempool_allocation)
-            chia_stats_full_node_connections.set(chia_stats_inst.full_node_connections)
-            chia_stats_blocks_won.set(chia_stats_inst.blocks_won)
-            chia_stats_seconds_since_last_win.set(chia_stats_inst.seconds_since_last_win)
-
-        except:
-            chia_stats_inst.clear_stats()
-
-            if WATCHDOG_MODE:
-                with counter_lock:
-                    error_counter += CHIA_STATS_COLLECTION_INTERVAL
-
-        sleep(CHIA_STATS_COLLECTION_INTERVAL)
-
-    loop.close()
-    asyncio.set_event_loop(None)
-
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='chiatter - the chia stats collection agent')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='report import and initialization times per component, then exit')
+    args = parser.parse_args()
+
     # catch SIGTERM and exit gracefully
     signal.signal(signal.SIGTERM, sigterm_handler)
     # catch SIGINT and exit gracefully
@@ -110,6 +58,11 @@ if __name__ == '__main__':
 
     logger.info(f'Starting chiatter - the chia stats collection agent...')
 
+    # the installed package version is enough, without importing chia
+    try:
+        chia_version = version('chia-blockchain')
+    except PackageNotFoundError:
+        chia_version = '0.0.0'
     logger.info(f'Detected chia-blockchain version: {chia_version}')
     # versions will be formatted as x.y.z
     client_version = chia_version.split('.')
@@ -119,97 +72,97 @@ if __name__ == '__main__':
 
     configParser = ConfigParser()
 
+    config_start_time = perf_counter()
     try:
         configParser.read(CONF_FILE_PATH)
         general_section = configParser['GENERAL']
 
         PROMETHEUS_CLIENT_PORT = general_section.getint('prometheus_client_port')
+        EXPOSITION_MODE = general_section.get('exposition_mode').strip()
+        EXPOSITION_REFRESH_INTERVAL = general_section.getint('exposition_refresh_interval')
         WATCHDOG_MODE = general_section.getboolean('watchdog_mode')
         WATCHDOG_INTERVAL = general_section.getint('watchdog_interval')
         WATCHDOG_THRESHOLD = general_section.getint('watchdog_threshold')
-        MODULES = [module.strip() for module in general_section.get('modules').split(',')]
-        # determine enabled modules
-        CHIA_STATS_MODULE = 'chia_stats' in MODULES
-        # parse collection intervals conditionally for each module
-        if CHIA_STATS_MODULE:
-            CHIA_STATS_COLLECTION_INTERVAL = configParser['CHIA_STATS'].getint('collection_interval')
-            CHIA_STATS_XCH_WON_BLOCK_TRANSACTION_FEE = configParser['CHIA_STATS'].getfloat('xch_won_block_transaction_fee')
-            CHIA_STATS_CONTRACT_ADDRESS_FILTER = configParser['CHIA_STATS'].get('contract_address_filter').strip()
-            CHIA_STATS_LOGGING_LEVEL = configParser['CHIA_STATS'].get('logging_level')
+        MODULE_RESTART_DELAY_MIN = general_section.getint('module_restart_delay_min')
+        MODULE_RESTART_DELAY_MAX = general_section.getint('module_restart_delay_max')
+        MODULES = [module.strip() for module in general_section.get('modules').split(',') if module.strip() != '']
+        # enabled modules are only imported here, and get to parse their own config section
+        module_workers = [module_worker(module, configParser, MODULE_RESTART_DELAY_MIN, MODULE_RESTART_DELAY_MAX)
+                          for module in MODULES]
 
     except:
         logger.critical('Could not parse configuration file. Please make sure the appropriate structure is in place!')
         raise SystemExit(2)
+    startup_profile.record('chiatter', 'parse config', perf_counter() - config_start_time)
+
+    if EXPOSITION_MODE not in ('standard', 'cached'):
+        logger.warning('Invalid exposition mode. Defaulting to standard.')
+        EXPOSITION_MODE = 'standard'
+
+    exposition_server_inst = None
+    # expose the metrics ahead of any module setup
+    with startup_profile.measure('chiatter', 'start http server'):
+        if EXPOSITION_MODE == 'cached':
+            # metrics are serialized and compressed once per completed collection, then served as they are
+            from modules.exposition_server import exposition_server
+            exposition_server_inst = exposition_server(REGISTRY, PROMETHEUS_CLIENT_PORT, EXPOSITION_REFRESH_INTERVAL)
+            exposition_server_inst.start()
+        else:
+            # start a Prometheus http server thread, which serializes the metrics on every scrape
+            start_http_server(PROMETHEUS_CLIENT_PORT)
+
+    if args.profile_startup:
+        for module_worker_inst in module_workers:
+            module_worker_inst.profile_startup()
+
+        logger.info('Startup profile:')
+        for line in startup_profile.report():
+            logger.info(line)
+        raise SystemExit(0)
+
+    # each module reports its metrics through its worker, whichever way it happens to run
+    for module_worker_inst in module_workers:
+        REGISTRY.register(module_worker_inst)
+        if exposition_server_inst is not None:
+            module_worker_inst.set_update_callback(exposition_server_inst.invalidate)
+    if exposition_server_inst is not None:
+        exposition_server_inst.invalidate()
 
-    ### Prometheus client metrics ####################################################################################################################
-
-    #--------------------------------------------------------- chia_stats ----------------------------------------------------------------------------
-    chia_stats_harvesters = Gauge('chia_stats_harvesters', 'Number of connected harvesters, as seen by the farmer')
-
-    chia_stats_duplicate_plots = Gauge('chia_stats_duplicate_plots', 'Number of duplicate plots across all harvesters')
-    chia_stats_failed_to_open_plots = Gauge('chia_stats_failed_to_open_plots', 'Number of plots with access errors across all harvesters')
-    chia_stats_no_key_plots = Gauge('chia_stats_no_key_plots', 'Number of plots without a valid key across all harvesters')
-
-    # OG plots
-    chia_stats_og_size = Gauge('chia_stats_og_size', 'Total size of og plots')
-    chia_stats_og_time_to_win = Gauge('chia_stats_og_time_to_win', 'OG time to win')
-    chia_stats_og_plots = [Gauge(f'chia_stats_og_plots_k{ksize + PLOT_BASE_KSIZE}',
-                                 f'Number of og k{ksize + PLOT_BASE_KSIZE} plots') for ksize in PLOT_KSIZE_RANGE]
-
-    # portable plots
-    chia_stats_portable_size = Gauge('chia_stats_portable_size', 'Total size of portable plots')
-    chia_stats_portable_time_to_win = Gauge('chia_stats_portable_time_to_win', 'Portable time to win')
-    chia_stats_portable_plots = [Gauge(f'chia_stats_portable_plots_k{ksize + PLOT_BASE_KSIZE}',
-                                          f'Number of portable k{ksize + PLOT_BASE_KSIZE} plots') for ksize in PLOT_KSIZE_RANGE]
-    chia_stats_plots_compression_level = [Gauge(f'chia_stats_plots_compression_level_c{clevel}',
-                                                   f'Number of C{clevel} compressed plots') for clevel in PLOT_COMPRESSION_LEVEL_RANGE]
-
-    chia_stats_sync_status = Gauge('chia_stats_sync_status', 'Blockchain synced status')
-    chia_stats_difficulty = Gauge('chia_stats_difficulty', 'Current difficulty on mainnet')
-    chia_stats_current_height = Gauge('chia_stats_current_height', 'Current blockchain height')
-    chia_stats_chia_farmed = Gauge('chia_stats_chia_farmed', 'XCH farmed')
-    chia_stats_wallet_funds = Gauge('chia_stats_wallet_funds', 'Funds present in the main chia wallet')
-    chia_stats_network_space_size = Gauge('chia_stats_network_space_size', 'Total network space')
-    chia_stats_mempool_size = Gauge('chia_stats_mempool_size', 'Total size of the mempool')
-    chia_stats_mempool_allocation = Gauge('chia_stats_mempool_allocation', 'Percentage of total mempool which is in use')
-    chia_stats_full_node_connections = Gauge('chia_stats_full_node_connections', 'Number of full node connections')
-    chia_stats_blocks_won = Gauge('chia_stats_blocks_won', 'Number of blocks won by the farmer')
-    chia_stats_seconds_since_last_win = Gauge('chia_stats_seconds_since_last_win', 'Number of seconds since last block win (farmer)')
-
-    #-------------------------------------------------------------------------------------------------------------------------------------------------
-
-    ##################################################################################################################################################
-
-    # start a Prometheus http server thread to expose the metrics
-    start_http_server(PROMETHEUS_CLIENT_PORT)
-
-    if CHIA_STATS_MODULE:
-        logger.info('*** Loading the chia_stats module ***')
-        chia_stats_inst = chia_stats(CHIA_STATS_LOGGING_LEVEL)
-        chia_stats_inst.set_won_block_transaction_fee(CHIA_STATS_XCH_WON_BLOCK_TRANSACTION_FEE)
-        if CHIA_STATS_CONTRACT_ADDRESS_FILTER != '':
-            chia_stats_inst.set_contract_address_filter(CHIA_STATS_CONTRACT_ADDRESS_FILTER)
-
-    counter_lock = threading.Lock()
     terminate_event = threading.Event()
     terminate_event.clear()
-    # counts errors for the chia_stats_worker
-    error_counter = 0
 
     try:
-        if CHIA_STATS_MODULE:
-            chia_stats_thread = threading.Thread(target=chia_stats_worker, args=(counter_lock,
-                                                                                 terminate_event, error_counter),
-                                                 daemon=True)
-            chia_stats_thread.start()
+        for module_worker_inst in module_workers:
+            module_worker_inst.start(terminate_event)
+
+        logger.info(f'Startup completed in {perf_counter() - IMPORT_START_TIME:.2f} seconds.')
 
         if WATCHDOG_MODE:
+            error_counts = [0] * len(module_workers)
+            restart_counts = [0] * len(module_workers)
+
             while not terminate_event.is_set():
-                if error_counter > WATCHDOG_THRESHOLD:
-                    logger.warning('The chiatter watchdog has reached its critical error threshold. Stopping data collection.')
-                    raise SystemExit(3)
-                else:
-                    sleep(WATCHDOG_INTERVAL)
+                sleep(WATCHDOG_INTERVAL)
+
+                for index, module_worker_inst in enumerate(module_workers):
+                    current_error_count = module_worker_inst.error_count()
+                    current_restart_count = module_worker_inst.restarts
+                    crashing_since = module_worker_inst.crashing_since
+                    # only trip if errors keep piling up and nothing has been successfully collected
+                    # in a while, since a single unreachable node isn't critical to a module
+                    if (current_error_count > error_counts[index] and
+                        monotonic() - module_worker_inst.last_success_time() > WATCHDOG_THRESHOLD):
+                        logger.warning('The chiatter watchdog has reached its critical error threshold. Stopping data collection.')
+                        raise SystemExit(3)
+                    # a module which keeps crashing (e.g. on setup) never gets to report any errors, and
+                    # starts afresh on every restart, so its restarts need to be kept track of as well
+                    if (current_restart_count > restart_counts[index] and crashing_since is not None and
+                        monotonic() - crashing_since > WATCHDOG_THRESHOLD):
+                        logger.warning('The chiatter watchdog has detected a module which keeps crashing. Stopping data collection.')
+                        raise SystemExit(3)
+
+                    error_counts[index] = current_error_count
+                    restart_counts[index] = current_restart_count
         else:
             # outside of watchdog mode simply wait forever, as the called threads
             # should never terminate unless critical exceptions are encountered
@@ -220,9 +173,10 @@ if __name__ == '__main__':
         terminate_event.set()
 
     finally:
-        # only wait to join threads in watchdog mode, otherwise terminate immediately
-        if WATCHDOG_MODE:
-            if CHIA_STATS_MODULE:
-                chia_stats_thread.join()
+        # wait for any in-progress collection to finish, so that the RPC clients get closed
+        for module_worker_inst in module_workers:
+            module_worker_inst.join()
+        if exposition_server_inst is not None:
+            exposition_server_inst.stop()
 
     logger.info(f'Thank you for using chiatter. Bye!')
@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+'''
+@author: Winter Snowfall
+@version: 3.50
+@date: 04/08/2025
+
+Warning: Built for use with python 3.6+
+'''
+
+import logging
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import resource
+import socket
+import statistics
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from aiohttp import web
+from chia.util.config import create_default_chia_config, load_config, save_config
+from chia.ssl.create_ssl import create_all_ssl
+from chia.server.server import ssl_context_for_server
+from prometheus_client import CollectorRegistry, generate_latest
+
+# logging configuration block
+LOGGER_FORMAT = '%(asctime)s %(levelname)s >>> %(message)s'
+# logging level for other modules
+logging.basicConfig(format=LOGGER_FORMAT, level=logging.ERROR)
+logger = logging.getLogger(__name__)
+# logging level for current logger
+logger.setLevel(logging.INFO)
+
+# default benchmark scales, as plots:transactions pairs
+DEFAULT_SCALES = '1000:100,10000:1000,100000:10000,1000000:100000'
+# metrics which are compared against a baseline, where lower is always better
+COMPARED_METRICS = ('cold_cycle', 'warm_cycle', 'peak_rss', 'traced_peak', 'scrape_p50')
+
+class mock_chia_node:
+    '''local stand-in for the farmer, full node and wallet RPC endpoints'''
+
+    _HARVESTER_PLOT_SIZE = 108 * 1024 ** 3
+    # every n-th plot will be an OG plot
+    _OG_PLOT_RATIO = 10
+    # every n-th wallet transaction will be a block win
+    _BLOCK_WIN_RATIO = 50
+    _BLOCK_WIN_AMOUNT = 250000000000
+    _CONTRACT_PUZZLE_HASH = '0x' + 'ab' * 32
+    # largest plot list page the farmer will return, as enforced by its paginator
+    _PLOT_PAGE_SIZE_LIMIT = 100
+    # every n-th mempool item gets replaced between mempool id requests
+    _MEMPOOL_CHURN_RATIO = 20
+
+    def __init__(self, harvesters, plots, transactions, wallets, mempool_size, latency, failure_rate, seed):
+        self._harvesters = harvesters
+        self._wallets = wallets
+        self._transactions = transactions
+        self._mempool_size = mempool_size
+        # index of the oldest mempool item, which moves forward as items get replaced
+        self._mempool_start = 0
+        self._latency = latency
+        self._failure_rate = failure_rate
+        self._random = random.Random(seed)
+
+        # plots are split as evenly as possible between harvesters
+        self._harvester_plots = {f'{harvester:064x}': plots // harvesters + (harvester < plots % harvesters)
+                                 for harvester in range(harvesters)}
+        self._sync_time = time.time()
+
+        self._routes = {'healthz': self._healthz,
+                        'get_harvesters_summary': self._get_harvesters_summary,
+                        'get_harvesters': self._get_harvesters,
+                        'get_harvester_plots_valid': self._get_harvester_plots_valid,
+                        'get_blockchain_state': self._get_blockchain_state,
+                        'get_connections': self._get_connections,
+                        'get_all_mempool_tx_ids': self._get_all_mempool_tx_ids,
+                        'get_mempool_item_by_tx_id': self._get_mempool_item_by_tx_id,
+                        'get_farmed_amount': self._get_farmed_amount,
+                        'get_height_info': self._get_height_info,
+                        'get_wallets': self._get_wallets,
+                        'get_wallet_balance': self._get_wallet_balance,
+                        'get_wallet_balances': self._get_wallet_balances,
+                        'get_transaction_count': self._get_transaction_count,
+                        'get_transactions': self._get_transactions}
+
+    def _healthz(self, request):
+        return {}
+
+    def _get_harvesters_summary(self, request):
+        return {'harvesters': [{'connection': {'node_id': node_id, 'host': '127.0.0.1', 'port': 8448},
+                                'plots': plots,
+                                'failed_to_open_filenames': 0,
+                                'no_key_filenames': 0,
+                                'duplicates': 0,
+                                'total_plot_size': plots * mock_chia_node._HARVESTER_PLOT_SIZE,
+                                'total_effective_plot_size': plots * mock_chia_node._HARVESTER_PLOT_SIZE,
+                                'syncing': None,
+                                'last_sync_time': self._sync_time,
+                                'harvesting_mode': 1}
+                               for node_id, plots in self._harvester_plots.items()]}
+
+    def _get_harvesters(self, request):
+        harvesters = self._get_harvesters_summary(request)
+        # the full response lists plots and plot file names instead of counts
+        for harvester in harvesters['harvesters']:
+            node_id = harvester['connection']['node_id']
+            harvester['plots'] = [self._plot(node_id, index) for index in range(harvester['plots'])]
+            harvester['failed_to_open_filenames'] = []
+            harvester['no_key_filenames'] = []
+            harvester['duplicates'] = []
+
+        return harvesters
+
+    def _plot(self, node_id, index):
+        og = index % mock_chia_node._OG_PLOT_RATIO == 0
+
+        return {'filename': f'/plots/{node_id[:8]}/plot-k32-c{index % 8}-{index:08d}.plot',
+                'size': 32 + (index % 100 == 0),
+                'plot_id': f'0x{index:064x}',
+                'pool_public_key': f'0x{index:096x}' if og else None,
+                'pool_contract_puzzle_hash': None if og else mock_chia_node._CONTRACT_PUZZLE_HASH,
+                'plot_public_key': f'0x{index:096x}',
+                'file_size': mock_chia_node._HARVESTER_PLOT_SIZE - index % 1024,
+                'time_modified': self._sync_time,
+                'compression_level': 0 if og else index % 8}
+
+    def _get_harvester_plots_valid(self, request):
+        node_id = request['node_id']
+        plots = self._harvester_plots[node_id]
+        page_size = request['page_size']
+        if page_size < 1 or page_size > mock_chia_node._PLOT_PAGE_SIZE_LIMIT:
+            return {'success': False, 'error': f'Invalid page size {page_size}'}
+        page_count = max(1, -(-plots // page_size))
+        start = request['page'] * page_size
+
+        # plot pages are generated on request, so that a million plots don't need to be kept in memory
+        return {'node_id': node_id,
+                'page': request['page'],
+                'page_count': page_count,
+                'total_count': plots,
+                'plots': [self._plot(node_id, index) for index in range(start, min(start + page_size, plots))]}
+
+    def _get_blockchain_state(self, request):
+        # without a peak, the average block time falls back to the chia default
+        return {'blockchain_state': {'peak': None,
+                                     'sync': {'synced': True, 'sync_mode': False,
+                                              'sync_progress_height': 0, 'sync_tip_height': 0},
+                                     'difficulty': 11264,
+                                     'space': 20 * 1024 ** 6,
+                                     'mempool_size': self._mempool_size,
+                                     'mempool_cost': self._mempool_size * 10000000,
+                                     'mempool_max_total_cost': 550000000000,
+                                     'mempool_fees': self._mempool_size * 1000}}
+
+    def _get_connections(self, request):
+        return {'connections': [{'node_id': f'{connection:064x}', 'type': 1 if connection % 4 else 3,
+                                 'peer_host': '127.0.0.1', 'peer_port': 8444}
+                                for connection in range(16)]}
+
+    def _mempool_item(self, index):
+        cost = 5000000 + (index % 50) * 1000000
+
+        return {'spend_bundle': {'coin_spends': [], 'aggregated_signature': '0x' + 'c0' * 96},
+                'fee': cost * (index * 7919 % 100) // 10,
+                'npc_result': {'Error': None, 'conds': None},
+                'cost': cost,
+                'spend_bundle_name': f'0x{index:064x}',
+                'additions': [],
+                'removals': []}
+
+    def _get_all_mempool_tx_ids(self, request):
+        # a few items get replaced every time, so that the incremental updates have something to do
+        self._mempool_start += max(self._mempool_size // mock_chia_node._MEMPOOL_CHURN_RATIO, 1)
+
+        return {'tx_ids': [f'0x{index:064x}' for index in range(self._mempool_start,
+                                                                self._mempool_start + self._mempool_size)]}
+
+    def _get_mempool_item_by_tx_id(self, request):
+        index = int(request['tx_id'], 16)
+        if index < self._mempool_start or index >= self._mempool_start + self._mempool_size:
+            return {'success': False, 'error': f'Tx id {request["tx_id"]} not in the mempool'}
+
+        return {'mempool_item': self._mempool_item(index)}
+
+    def _get_farmed_amount(self, request):
+        blocks_won = self._transactions // mock_chia_node._BLOCK_WIN_RATIO
+
+        return {'farmed_amount': blocks_won * mock_chia_node._BLOCK_WIN_AMOUNT,
+                'pool_reward_amount': blocks_won * mock_chia_node._BLOCK_WIN_AMOUNT,
+                'farmer_reward_amount': 0, 'fee_amount': 0, 'last_height_farmed': 0}
+
+    def _get_height_info(self, request):
+        return {'height': 5000000}
+
+    def _get_wallets(self, request):
+        # a standard wallet, followed by CAT wallets
+        return {'wallets': [{'id': 1, 'name': 'Chia Wallet', 'type': 0, 'data': ''}] +
+                           [{'id': wallet_id, 'name': f'CAT {wallet_id}', 'type': 6, 'data': ''}
+                            for wallet_id in range(2, self._wallets + 1)]}
+
+    def _wallet_balance(self, wallet_id):
+        balance = self._transactions * 1000 if wallet_id == 1 else wallet_id * 1000
+
+        return {'wallet_id': wallet_id, 'wallet_type': 0 if wallet_id == 1 else 6,
+                'confirmed_wallet_balance': balance, 'unconfirmed_wallet_balance': balance,
+                'spendable_balance': balance, 'pending_change': 0, 'max_send_amount': balance,
+                'unspent_coin_count': 1, 'pending_coin_removal_count': 0}
+
+    def _get_wallet_balance(self, request):
+        return {'wallet_balance': self._wallet_balance(request['wallet_id'])}
+
+    def _get_wallet_balances(self, request):
+        return {'wallet_balances': {wallet_id: self._wallet_balance(wallet_id) for wallet_id in request['wallet_ids']}}
+
+    def _get_transaction_count(self, request):
+        return {'count': self._transactions}
+
+    def _transaction(self, index):
+        block_win = index % mock_chia_node._BLOCK_WIN_RATIO == 0
+
+        return {'confirmed_at_height': index,
+                'created_at_time': int(self._sync_time) - self._transactions + index,
+                'to_puzzle_hash': '0x' + '00' * 32,
+                'amount': mock_chia_node._BLOCK_WIN_AMOUNT if block_win else 1000,
+                'fee_amount': 0,
+                'confirmed': True,
+                'sent': 0,
+                'spend_bundle': None,
+                'additions': [{'parent_coin_info': f'0x{index:064x}', 'puzzle_hash': '0x' + '00' * 32,
+                               'amount': mock_chia_node._BLOCK_WIN_AMOUNT if block_win else 1000}],
+                'removals': [],
+                'wallet_id': 1,
+                'sent_to': [],
+                'trade_id': None,
+                'type': 0,
+                'name': f'0x{index:064x}',
+                'memos': {},
+                'valid_times': {}}
+
+    def _get_transactions(self, request):
+        end = min(request.get('end', self._transactions), self._transactions)
+
+        return {'transactions': [self._transaction(index) for index in range(request.get('start', 0), end)],
+                'wallet_id': request['wallet_id']}
+
+    async def _handle(self, request):
+        route = self._routes.get(request.match_info['endpoint'])
+        if route is None:
+            return web.json_response({'success': False, 'error': 'unknown endpoint'})
+
+        if self._latency > 0:
+            await asyncio.sleep(self._latency)
+        if self._failure_rate > 0 and self._random.random() < self._failure_rate:
+            raise web.HTTPInternalServerError()
+
+        response = route(await request.json())
+        response.setdefault('success', True)
+
+        return web.json_response(response)
+
+    def serve(self, root_path, ports, ready_event):
+        config = load_config(root_path, 'config.yaml')
+        ssl_context = ssl_context_for_server(root_path / config['private_ssl_ca']['crt'],
+                                             root_path / config['private_ssl_ca']['key'],
+                                             root_path / config['daemon_ssl']['private_crt'],
+                                             root_path / config['daemon_ssl']['private_key'],
+                                             check_permissions=False)
+        # allow for million plot responses
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_post('/{endpoint}', self._handle)
+
+        async def run():
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            # the same endpoints are served on all service ports, as none of their names overlap
+            for port in ports:
+                await web.TCPSite(runner, config['self_hostname'], port, ssl_context=ssl_context).start()
+            ready_event.set()
+            # runs until terminated by the benchmark
+            await asyncio.Event().wait()
+
+        asyncio.run(run())
+
+def serve_mock_node(root_path, ports, ready_event, **kwargs):
+    mock_chia_node(**kwargs).serve(root_path, ports, ready_event)
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+def create_chia_root(root_path):
+    # certificates and config for the stand-in node, without the noise
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_default_chia_config(root_path)
+        create_all_ssl(root_path, private_node_names=['daemon', 'farmer', 'full_node', 'wallet'],
+                       public_node_names=[])
+
+    config = load_config(root_path, 'config.yaml')
+    config['self_hostname'] = '127.0.0.1'
+    for service in ('farmer', 'full_node', 'wallet'):
+        config[service]['rpc_port'] = free_port()
+    save_config(root_path, 'config.yaml', config)
+
+    return [config[service]['rpc_port'] for service in ('farmer', 'full_node', 'wallet')]
+
+async def timed_collection(chia_stats_inst):
+    start_time = time.perf_counter()
+    try:
+        await chia_stats_inst.collect_stats()
+    except Exception as exception:
+        logger.warning(f'Collection failed: {type(exception)} {exception}')
+
+    return time.perf_counter() - start_time
+
+async def benchmark_cycles(root_path, state_path, cycles, scrapes, rpc_timeout, plot_inventory_mode):
+    # imported here, so that the chia_stats logger and state files are set up in the benchmark process only
+    import modules.chia_stats as chia_stats_module
+    from modules.chia_stats_collector import chia_stats_collector
+
+    # keep the block win checkpoint and snapshot away from the real state files
+    chia_stats_module.WIN_CHECKPOINT_FILE_PATH = os.path.join(state_path, 'chia_stats_wins.json')
+    chia_stats_module.SNAPSHOT_FILE_PATH = os.path.join(state_path, 'chia_stats_snapshot.json')
+
+    chia_stats_inst = chia_stats_module.chia_stats('WARNING', root_path=root_path)
+    chia_stats_inst.set_won_block_transaction_fee(0.01)
+    chia_stats_inst.set_rpc_timeout(rpc_timeout)
+    chia_stats_inst.set_plot_inventory_mode(plot_inventory_mode)
+    chia_stats_inst.enable_mempool_stats()
+
+    # the first cycle does all the heavy lifting, while subsequent ones should mostly hit the caches
+    cycle_times = [await timed_collection(chia_stats_inst) for cycle in range(cycles)]
+
+    registry = CollectorRegistry()
+    registry.register(chia_stats_collector([chia_stats_inst]))
+    scrape_times = []
+    for scrape in range(scrapes):
+        start_time = time.perf_counter()
+        generate_latest(registry)
+        scrape_times.append(time.perf_counter() - start_time)
+
+    result = {'cold_cycle': cycle_times[0],
+              'warm_cycle': statistics.median(cycle_times[1:]) if cycles > 1 else None,
+              'scrape_p50': statistics.median(scrape_times),
+              'scrape_max': max(scrape_times),
+              'blocks_won': chia_stats_inst.blocks_won,
+              'plots': sum(harvester['plots'] for harvester in chia_stats_inst.harvester_stats.values()),
+              'errors': chia_stats_inst.error_count,
+              # reported in KiB on Linux
+              'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    await chia_stats_inst.close_clients()
+
+    # allocations are traced on a separate cold cycle, since tracing slows everything down
+    for state_file in (chia_stats_module.WIN_CHECKPOINT_FILE_PATH, chia_stats_module.SNAPSHOT_FILE_PATH):
+        if os.path.exists(state_file):
+            os.remove(state_file)
+    chia_stats_inst = chia_stats_module.chia_stats('WARNING', root_path=root_path)
+    chia_stats_inst.set_rpc_timeout(rpc_timeout)
+    chia_stats_inst.set_plot_inventory_mode(plot_inventory_mode)
+    chia_stats_inst.enable_mempool_stats()
+
+    tracemalloc.start()
+    await timed_collection(chia_stats_inst)
+    traced_peak = tracemalloc.get_traced_memory()[1]
+    allocations = sum(statistic.count for statistic in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+    await chia_stats_inst.close_clients()
+
+    result['traced_peak'] = traced_peak / 1024 ** 2
+    result['retained_allocations'] = allocations
+
+    return result
+
+def run_benchmark(root_path, state_path, cycles, scrapes, rpc_timeout, plot_inventory_mode, result_queue):
+    # each scale runs in its own process, so that peak RSS values don't carry over
+    result_queue.put(asyncio.run(benchmark_cycles(root_path, state_path, cycles, scrapes, rpc_timeout,
+                                                  plot_inventory_mode)))
+
+def run_scale(context, root_path, ports, plots, transactions, args):
+    ready_event = context.Event()
+    server = context.Process(target=serve_mock_node, args=(root_path, ports, ready_event),
+                             kwargs={'harvesters': args.harvesters, 'plots': plots,
+                                     'transactions': transactions, 'wallets': args.wallets,
+                                     'mempool_size': args.mempool_size,
+                                     'latency': args.latency / 1000, 'failure_rate': args.failure_rate,
+                                     'seed': args.seed},
+                             daemon=True)
+    server.start()
+
+    try:
+        if not ready_event.wait(60):
+            raise Exception('Mock chia node failed to start.')
+
+        with tempfile.TemporaryDirectory() as state_path:
+            result_queue = context.Queue()
+            benchmark = context.Process(target=run_benchmark, args=(root_path, state_path, args.cycles,
+                                                                    args.scrapes, args.rpc_timeout,
+                                                                    args.plot_inventory_mode, result_queue))
+            benchmark.start()
+            result = result_queue.get()
+            benchmark.join()
+
+    finally:
+        server.terminate()
+        server.join()
+
+    return dict(result, scale=f'{plots}:{transactions}')
+
+def format_value(value, scale=1, precision=1):
+    return '-' if value is None else f'{value * scale:.{precision}f}'
+
+def print_results(results):
+    print(f'{"plots:transactions":>20} {"cold (s)":>9} {"warm (s)":>9} {"RSS (MiB)":>10} {"traced (MiB)":>13} '
+          f'{"retained":>9} {"scrape p50/max (ms)":>20} {"errors":>7}')
+    for result in results:
+        print(f'{result["scale"]:>20} {format_value(result["cold_cycle"], precision=3):>9} '
+              f'{format_value(result["warm_cycle"], precision=3):>9} {format_value(result["peak_rss"]):>10} '
+              f'{format_value(result["traced_peak"]):>13} {result["retained_allocations"]:>9} '
+              f'{format_value(result["scrape_p50"], 1000, 2) + "/" + format_value(result["scrape_max"], 1000, 2):>20} '
+              f'{result["errors"]:>7}')
+
+def compare_results(results, baseline_results, tolerance):
+    baseline = {result['scale']: result for result in baseline_results}
+    regressions = []
+
+    for result in results:
+        baseline_result = baseline.get(result['scale'])
+        if baseline_result is None:
+            continue
+        for metric in COMPARED_METRICS:
+            value = result.get(metric)
+            baseline_value = baseline_result.get(metric)
+            if value is not None and baseline_value and value > baseline_value * (1 + tolerance):
+                regressions.append(f'{result["scale"]} {metric}: {baseline_value:.4f} -> {value:.4f}')
+
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark chia_stats collections against a local mock chia node.')
+    parser.add_argument('--scales', default=DEFAULT_SCALES,
+                        help=f'comma separated plots:transactions pairs (default: {DEFAULT_SCALES})')
+    parser.add_argument('--harvesters', type=int, default=4, help='number of harvesters to spread the plots over')
+    parser.add_argument('--wallets', type=int, default=10, help='number of wallets (one standard, the rest CATs)')
+    parser.add_argument('--mempool-size', type=int, default=1000, help='number of mempool items reported')
+    parser.add_argument('--latency', type=float, default=0, help='latency injected into each RPC call, in ms')
+    parser.add_argument('--failure-rate', type=float, default=0, help='fraction of RPC calls which will fail')
+    parser.add_argument('--seed', type=int, default=0, help='seed used for the injected failures')
+    parser.add_argument('--plot-inventory-mode', choices=('paginated', 'streaming'), default='paginated',
+                        help='how plot lists are fetched from the farmer (default: paginated)')
+    parser.add_argument('--cycles', type=int, default=3, help='collection cycles per scale (first one is cold)')
+    parser.add_argument('--scrapes', type=int, default=20, help='Prometheus scrapes per scale')
+    parser.add_argument('--rpc-timeout', type=int, default=300, help='chia_stats RPC timeout, in seconds')
+    parser.add_argument('--output', help='save the results to this JSON file')
+    parser.add_argument('--baseline', help='compare the results to those saved in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='relative slowdown allowed before a baseline comparison fails (default: 0.25)')
+    args = parser.parse_args()
+
+    scales = [tuple(int(value) for value in scale.split(':')) for scale in args.scales.split(',')]
+    # spawned processes don't inherit the memory of the parent process
+    context = multiprocessing.get_context('spawn')
+    results = []
+
+    with tempfile.TemporaryDirectory() as root_directory:
+        root_path = Path(root_directory)
+        ports = create_chia_root(root_path)
+
+        for plots, transactions in scales:
+            logger.info(f'Benchmarking {plots} plots on {args.harvesters} harvesters and {transactions} transactions...')
+            results.append(run_scale(context, root_path, ports, plots, transactions, args))
+
+    print_results(results)
+
+    if args.output is not None:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=4)
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as baseline_file:
+            regressions = compare_results(results, json.load(baseline_file), args.tolerance)
+
+        if len(regressions) > 0:
+            logger.warning('Performance regressions detected:')
+            for regression in regressions:
+                logger.warning(regression)
+            raise SystemExit(1)
+
+        logger.info('No performance regressions detected.')
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+'''
+@author: Winter Snowfall
+@version: 3.50
+@date: 04/08/2025
+
+Warning: Built for use with python 3.6+
+'''
+
+from collections import deque
+
+class block_time_estimator:
+    '''rolling average block time, updated incrementally as the blockchain peak advances'''
+
+    # extra blocks kept at the start of the window, so that a transaction block
+    # can always be found at or below the start of the sampled range
+    _WINDOW_MARGIN = 100
+    # number of block records to fetch per request
+    _PAGE_SIZE = 200
+
+    def __init__(self, sample_size, default_block_time):
+        self._sample_size = sample_size
+        self._default_block_time = default_block_time
+
+        # (height, timestamp) of the transaction blocks within the window, oldest first
+        self._transaction_blocks = deque()
+        # last processed block, used to detect reorgs
+        self._height = None
+        self._header_hash = None
+
+        self.average_block_time = default_block_time
+
+    def _reset(self):
+        self._transaction_blocks.clear()
+        self._height = None
+        self._header_hash = None
+
+    async def _fetch_range(self, start, end, fetch_block_records):
+        block_records = []
+
+        for page_start in range(start, end, block_time_estimator._PAGE_SIZE):
+            block_records.extend(await fetch_block_records(page_start,
+                                                           min(page_start + block_time_estimator._PAGE_SIZE, end)))
+
+        return block_records
+
+    async def update(self, peak_height, peak_header_hash, fetch_block_records):
+        # nothing to do until the peak moves
+        if peak_header_hash == self._header_hash:
+            return self.average_block_time
+
+        # same as chia's get_average_block_time, which won't bother with young blockchains
+        if peak_height < self._sample_size + block_time_estimator._WINDOW_MARGIN:
+            self._reset()
+            self.average_block_time = self._default_block_time
+            return self.average_block_time
+
+        window_start = peak_height - self._sample_size - block_time_estimator._WINDOW_MARGIN
+
+        # the whole window is fetched on the first run, after a lower/same height reorg or a long gap
+        if self._height is None or peak_height <= self._height or self._height < window_start:
+            self._reset()
+            block_records = await self._fetch_range(window_start, peak_height + 1, fetch_block_records)
+        else:
+            block_records = await self._fetch_range(self._height + 1, peak_height + 1, fetch_block_records)
+            # the new blocks must extend the ones already processed, otherwise a reorg happened in between
+            if len(block_records) > 0 and block_records[0]['prev_hash'] != self._header_hash:
+                self._reset()
+                block_records = await self._fetch_range(window_start, peak_height + 1, fetch_block_records)
+
+        if len(block_records) == 0:
+            return self.average_block_time
+
+        for block_record in block_records:
+            # only transaction blocks have a timestamp
+            if block_record['timestamp'] is not None:
+                self._transaction_blocks.append((block_record['height'], block_record['timestamp']))
+
+        self._height = block_records[-1]['height']
+        self._header_hash = block_records[-1]['header_hash']
+
+        if len(self._transaction_blocks) >= 2:
+            # compare against the newest transaction block at or below the start of the sampled range
+            sample_start = self._transaction_blocks[-1][0] - self._sample_size
+            while len(self._transaction_blocks) > 2 and self._transaction_blocks[1][0] <= sample_start:
+                self._transaction_blocks.popleft()
+
+            newest_height, newest_timestamp = self._transaction_blocks[-1]
+            oldest_height, oldest_timestamp = self._transaction_blocks[0]
+            self.average_block_time = (newest_timestamp - oldest_timestamp) / (newest_height - oldest_height)
+
+        return self.average_block_time
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+'''
+@author: Winter Snowfall
+@version: 3.50
+@date: 04/08/2025
+
+Warning: Built for use with python 3.6+
+'''
+
+from bisect import bisect_right
+
+class block_win_index:
+    '''block wins indexed by height, built from the reward coins sent to the farmer and pool targets'''
+
+    # reward coin types, as stored for each won block
+    REWARD_TYPES = ('farmer', 'pool')
+
+    def __init__(self, halving_heights, puzzle_hashes, start_height):
+        self._halving_heights = halving_heights
+        # only wins paid to these puzzle hashes (as sorted hex strings) are part of the index
+        self.puzzle_hashes = puzzle_hashes
+        self.start_height = start_height
+
+        # [confirmed height, farmer reward, pool reward, timestamp], keyed by won block height
+        self._wins = {}
+        # all coins confirmed up to (and including) this height have been indexed
+        self.scanned_height = start_height - 1
+
+        # [blocks won, farmer rewards, pool rewards] for each halving era, kept up to date on every change
+        self.era_stats = [[0, 0, 0] for _ in halving_heights]
+        self.last_win_time = 0
+
+    def __len__(self):
+        return len(self._wins)
+
+    def _era(self, height):
+        return max(bisect_right(self._halving_heights, height) - 1, 0)
+
+    def add_reward(self, won_height, confirmed_height, reward_type, amount, timestamp):
+        era_stats = self.era_stats[self._era(won_height)]
+
+        win = self._wins.get(won_height)
+        if win is None:
+            win = [confirmed_height, 0, 0, timestamp]
+            self._wins[won_height] = win
+            era_stats[0] += 1
+
+        reward_index = 1 + block_win_index.REWARD_TYPES.index(reward_type)
+        win[reward_index] += amount
+        era_stats[reward_index] += amount
+
+        win[3] = max(win[3], timestamp)
+        self.last_win_time = max(self.last_win_time, timestamp)
+
+    def rewind(self, height):
+        # drops everything confirmed at or above the given height, so that it can be scanned again after a reorg
+        if height > self.scanned_height:
+            return
+
+        for won_height in [won_height for won_height, win in self._wins.items() if win[0] >= height]:
+            _, farmer_reward, pool_reward, _ = self._wins.pop(won_height)
+            era_stats = self.era_stats[self._era(won_height)]
+            era_stats[0] -= 1
+            era_stats[1] -= farmer_reward
+            era_stats[2] -= pool_reward
+
+        self.last_win_time = max((win[3] for win in self._wins.values()), default=0)
+        self.scanned_height = max(height, self.start_height) - 1
+
+    def to_dict(self):
+        return {'puzzle_hashes': self.puzzle_hashes,
+                'start_height': self.start_height,
+                'scanned_height': self.scanned_height,
+                # JSON object keys are strings, so wins are stored as [won height, ...] lists instead
+                'wins': [[won_height] + win for won_height, win in sorted(self._wins.items())]}
+
+    def load_dict(self, data):
+        # an index built for other reward targets or another start height can't be reused
+        if data['puzzle_hashes'] != self.puzzle_hashes or data['start_height'] != self.start_height:
+            return False
+
+        for won_height, confirmed_height, farmer_reward, pool_reward, timestamp in data['wins']:
+            self.add_reward(won_height, confirmed_height, 'farmer', farmer_reward, timestamp)
+            self.add_reward(won_height, confirmed_height, 'pool', pool_reward, timestamp)
+        self.scanned_height = data['scanned_height']
+
+        return True
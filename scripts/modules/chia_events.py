@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+'''
+@author: Winter Snowfall
+@version: 3.50
+@date: 04/08/2025
+
+Warning: Built for use with python 3.6+
+'''
+
+import logging
+import asyncio
+import json
+import uuid
+import aiohttp
+
+# log through the chia_stats logger (and its file handler)
+logger = logging.getLogger('modules.chia_stats.events')
+
+class chia_events:
+    '''listen to state change events sent by the chia daemon'''
+
+    # chia services will send their state changes to anyone registered as 'metrics'
+    _SERVICE_NAME = 'metrics'
+    _HEARTBEAT = 30
+    _RECONNECT_BACKOFF_MIN = 2
+    _RECONNECT_BACKOFF_MAX = 60
+    # same as the default daemon_max_message_size
+    _MAX_MESSAGE_SIZE = 50 * 1000 * 1000
+
+    def __init__(self, url, ssl_context=None):
+        # ssl_context should only be None for plain ws:// endpoints (e.g. a local stand-in server)
+        self._url = url
+        self._ssl_context = ssl_context
+
+        self.connected = False
+
+    def _register_message(self):
+        return json.dumps({'command': 'register_service',
+                           'ack': False,
+                           'data': {'service': chia_events._SERVICE_NAME},
+                           'request_id': uuid.uuid4().hex,
+                           'destination': 'daemon',
+                           'origin': 'chiatter'})
+
+    async def _listen(self, session, stop_event, on_event):
+        async with session.ws_connect(self._url, heartbeat=chia_events._HEARTBEAT,
+                                      ssl=self._ssl_context if self._ssl_context is not None else False,
+                                      max_msg_size=chia_events._MAX_MESSAGE_SIZE) as websocket:
+            await websocket.send_str(self._register_message())
+
+            self.connected = True
+            logger.info(f'Listening for chia events on {self._url}...')
+
+            while not stop_event.is_set():
+                message = await websocket.receive()
+
+                if message.type == aiohttp.WSMsgType.TEXT:
+                    event = json.loads(message.data)
+                    # skip acknowledgements of our own requests
+                    if event.get('ack', False):
+                        continue
+                    on_event(event.get('origin'), event.get('command'), event.get('data', {}))
+                elif message.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED,
+                                      aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.ERROR):
+                    logger.warning('Chia daemon closed the event stream.')
+                    break
+
+    async def _run(self, stop_event, on_event):
+        reconnect_backoff = chia_events._RECONNECT_BACKOFF_MIN
+
+        async with aiohttp.ClientSession() as session:
+            while not stop_event.is_set():
+                try:
+                    await self._listen(session, stop_event, on_event)
+                    reconnect_backoff = chia_events._RECONNECT_BACKOFF_MIN
+
+                except asyncio.CancelledError:
+                    raise
+
+                except Exception as exception:
+                    logger.warning(f'Chia event stream failed: {type(exception)} {exception}')
+
+                finally:
+                    self.connected = False
+
+                if not stop_event.is_set():
+                    logger.info(f'Reconnecting to the chia event stream in {reconnect_backoff} seconds...')
+                    try:
+                        await asyncio.wait_for(stop_event.wait(), reconnect_backoff)
+                    except asyncio.TimeoutError:
+                        pass
+                    reconnect_backoff = min(reconnect_backoff * 2, chia_events._RECONNECT_BACKOFF_MAX)
+
+    async def run(self, stop_event, on_event):
+        listener = asyncio.ensure_future(self._run(stop_event, on_event))
+
+        # the listener may be blocked waiting on a message, so cancel it once we're stopped
+        await stop_event.wait()
+        listener.cancel()
+
+        try:
+            await listener
+        except asyncio.CancelledError:
+            pass
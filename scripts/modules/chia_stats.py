@@ -9,17 +9,39 @@ Warning: Built for use with python 3.6+
 
 import logging
 import os
+import asyncio
+import json
+import time
 import binascii
+from pathlib import Path
+from bisect import bisect_right
 from datetime import datetime
 from logging.handlers import RotatingFileHandler
 from aiohttp.client_exceptions import ClientConnectorError
+from chia import __version__ as chia_version
 from chia.util.config import load_config
 from chia.rpc.farmer_rpc_client import FarmerRpcClient
 from chia.rpc.wallet_rpc_client import WalletRpcClient
 from chia.rpc.full_node_rpc_client import FullNodeRpcClient
+from chia.rpc.rpc_client import ResponseFailureError
 from chia.util.default_root import DEFAULT_ROOT_PATH
 from chia.util import bech32m
-from chia.cmds.farm_funcs import get_average_block_time
+from chia.wallet.util.wallet_types import WalletType
+from chia.cmds.farm_funcs import SECONDS_PER_BLOCK
+from chia.consensus.default_constants import DEFAULT_CONSTANTS
+from chia.server.server import ssl_context_for_client
+from modules.plot_columns import plot_columns
+from modules.harvester_stream import harvester_stream
+from modules.circuit_breaker import circuit_breaker
+from modules.block_time_estimator import block_time_estimator
+from modules.mempool_index import mempool_index
+from modules.block_win_index import block_win_index
+from modules.proof_stats import proof_stats
+from modules.chia_events import chia_events
+from modules.chia_stats_module import LOCAL_NODE_NAME
+from modules.chiatter_metrics import (chiatter_rpc_duration, chiatter_section_duration,
+                                      chiatter_items_processed, chiatter_errors, chiatter_circuit_breaker_state,
+                                      chiatter_circuit_breaker_trips)
 # uncomment for debugging purposes only
 #import traceback
 
@@ -33,10 +55,43 @@ logging.basicConfig(format=LOGGER_FORMAT, level=logging.ERROR)
 logger = logging.getLogger(__name__)
 logger.addHandler(logger_file_handler)
 
+# state files block
+WIN_CHECKPOINT_FILE_PATH = os.path.join('..', 'state', 'chia_stats_wins.json')
+WIN_INDEX_FILE_PATH = os.path.join('..', 'state', 'chia_stats_win_index.json')
+SNAPSHOT_FILE_PATH = os.path.join('..', 'state', 'chia_stats_snapshot.json')
+
+# parsed chia config.yaml files, as (mtime, config), keyed by file path
+chia_configs = {}
+
+def load_chia_config(root_path):
+    # config.yaml is only parsed again once it has been modified
+    config_file_path = root_path / 'config' / 'config.yaml'
+    config_mtime = os.stat(config_file_path).st_mtime_ns
+
+    cached_config = chia_configs.get(config_file_path)
+    if cached_config is None or cached_config[0] != config_mtime:
+        cached_config = (config_mtime, load_config(root_path, 'config.yaml'))
+        chia_configs[config_file_path] = cached_config
+
+    return cached_config[1]
+
+def write_json_atomically(file_path, data):
+    # write to a temporary file first, so that a crash can never leave behind a partial file
+    temp_file_path = file_path + '.tmp'
+    with open(temp_file_path, 'w') as temp_file:
+        json.dump(data, temp_file)
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+    os.replace(temp_file_path, file_path)
+
 class chia_stats:
     '''gather stats using the chia RPC clients'''
 
     _logging_level = logging.WARNING
+    # global limit of concurrent section collections, across all nodes
+    _max_concurrent_collections = 8
+    _collection_slots = None
+    _collection_slots_loop = None
 
     _PLOT_BASE_KSIZE = 32
     # starts at k32 and goes up to k41 (should be enough
@@ -54,16 +109,144 @@ class chia_stats:
     _WON_BLOCK_HALVING_HEIGHTS = [5045760 * halving for halving in range(_HALVING_EVENTS + 1)]
     # 0.25 XCH is the initial won block transaction amount
     _WON_BLOCK_TRANSACTION_AMOUNTS = [int(250000000000 / (2 ** exp)) for exp in range(_HALVING_EVENTS + 1)]
+    # number of wallet transactions to fetch per block win scanner request
+    _TRANSACTION_PAGE_SIZE = 500
+    # transactions scans the wallet for block win amounts, while coin_records
+    # indexes the reward coins sent to the farmer and pool targets instead
+    _BLOCK_WIN_ENGINES = ('transactions', 'coin_records')
+    # number of blocks to query reward coins for per request, on the way up to the peak
+    _WIN_INDEX_HEIGHT_RANGE = 100000
+    # the most recent blocks are always scanned again, so that reorgs are accounted for
+    _WIN_INDEX_REORG_DEPTH = 32
+    # number of plots to fetch per harvester plot list request, capped by the farmer at 100
+    _PLOT_PAGE_SIZE = 100
+    # paginated fetches plot lists per harvester, while streaming parses the full
+    # get_harvesters response as it arrives, with a single request per collection
+    _PLOT_INVENTORY_MODES = ('paginated', 'streaming')
+    # number of bytes read at a time from a streamed get_harvesters response
+    _STREAM_CHUNK_SIZE = 65536
+    # number of blocks the average block time is computed over
+    _BLOCK_TIME_SAMPLE_SIZE = 500
+    # number of wallets per get_wallet_balances request, and number of requests in flight
+    _WALLET_BALANCE_BATCH_SIZE = 25
+    _WALLET_BALANCE_CONCURRENCY = 4
+    # mempool additions are fetched item by item, with a few requests in flight, and at most this many per run,
+    # while any others (e.g. during dust storms, or on the first run) are carried over to the following runs
+    _MEMPOOL_ITEM_FETCH_LIMIT = 200
+    _MEMPOOL_ITEM_CONCURRENCY = 8
+    # cost of a standard XCH transaction, as used by the chia fee estimator
+    _MEMPOOL_REFERENCE_COST = 9401710
+    # minimum number of seconds between warm-start snapshots in scheduled mode
+    _SNAPSHOT_INTERVAL = 60
+
+    # RPC service queried by each section, with one circuit breaker per service
+    _SECTION_SERVICES = {'farmer': 'farmer',
+                         'blockchain': 'full_node',
+                         'block_time': 'full_node',
+                         'mempool': 'full_node',
+                         'wallet': 'wallet',
+                         'block_wins': 'full_node'}
+
+    # daemon events which will trigger a refresh of a section, keyed by (origin service, event)
+    _EVENT_SECTIONS = {('chia_farmer', 'harvester_update'): 'farmer',
+                       ('chia_farmer', 'harvester_removed'): 'farmer',
+                       ('chia_farmer', 'add_connection'): 'farmer',
+                       ('chia_farmer', 'close_connection'): 'farmer',
+                       ('chia_full_node', 'get_blockchain_state'): 'blockchain',
+                       ('chia_wallet', 'coin_added'): 'wallet',
+                       ('chia_wallet', 'sync_changed'): 'wallet'}
+    # seconds to wait after an event before refreshing a section
+    _EVENT_COALESCE_DELAY = 2
+    # daemon events which feed the proof lookup stats
+    _PROOF_EVENTS = (('chia_farmer', 'new_signage_point'),
+                     ('chia_farmer', 'new_farming_info'),
+                     ('chia_farmer', 'harvester_removed'))
+
+    # state that gets persisted in the warm-start snapshot
+    _SNAPSHOT_FIELDS = ('_chia_farmed_prev', '_last_win_max_time', '_average_block_time',
+                        'harvesters', 'harvester_stats', 'plots_duplicates', 'plots_failed_to_open', 'plots_no_key',
+                        'og_size', 'portable_size', 'plots_og', 'plots_portable', 'plots_clevel',
+                        'sync_status', 'difficulty', 'network_space_size', 'mempool_size',
+                        'mempool_allocation', 'full_node_connections', 'og_time_to_win',
+                        'portable_time_to_win', 'current_height', 'wallet_funds', 'wallet_balances',
+                        'chia_farmed', 'blocks_won', 'block_win_eras')
 
-    def __init__(self, logging_level):
+    def __init__(self, logging_level, node_name=LOCAL_NODE_NAME, node_config=None, root_path=DEFAULT_ROOT_PATH):
+        # a non-default chia root is only meant for running against a local stand-in node (e.g. the benchmark)
+        self._root_path = root_path
+        # remote nodes are described by their node_config, while the local one uses the chia config.yaml
+        self._node_config = node_config
+        self._logger = logger.getChild(node_name)
+
+        self.node_name = node_name
+        # the local node keeps using the original state files
+        if node_name == LOCAL_NODE_NAME:
+            self._win_checkpoint_file_path = WIN_CHECKPOINT_FILE_PATH
+            self._win_index_file_path = WIN_INDEX_FILE_PATH
+            self._snapshot_file_path = SNAPSHOT_FILE_PATH
+        else:
+            self._win_checkpoint_file_path = WIN_CHECKPOINT_FILE_PATH.replace('.json', f'_{node_name}.json')
+            self._win_index_file_path = WIN_INDEX_FILE_PATH.replace('.json', f'_{node_name}.json')
+            self._snapshot_file_path = SNAPSHOT_FILE_PATH.replace('.json', f'_{node_name}.json')
         self._contract_address_filter = None
         self._decoded_puzzle_hash = None
+        self._rpc_timeout = 30
+        self._plot_inventory_mode = 'paginated'
+        self._average_block_time = 0
+        self._block_time_estimator = block_time_estimator(chia_stats._BLOCK_TIME_SAMPLE_SIZE, SECONDS_PER_BLOCK)
+        self._mempool_index = mempool_index(DEFAULT_CONSTANTS.MAX_BLOCK_COST_CLVM, chia_stats._MEMPOOL_REFERENCE_COST)
+        # ids of the mempool items which are yet to be fetched, oldest first
+        self._mempool_pending_tx_ids = []
 
         self._chia_farmed_prev = 0
         self._seconds_since_last_win_stale = False
         self._last_win_max_time = 0
+        # wallet height at which balances were last fetched
+        self._wallet_height = None
+        self._main_wallet_id = None
+        # block win scanner state, persisted to disk between runs
+        self._win_checkpoint_loaded = False
+        self._win_scan_cursor = 0
+        self._win_scan_last_name = None
+        self._block_win_engine = 'transactions'
+        self._block_win_start_height = 0
+        # reward coin based block win index, only used by the coin_records engine
+        self._win_index = None
+        # (farmer, pool) reward puzzle hashes, as last fetched by the farmer section
+        self._reward_puzzle_hashes = None
+        # per-harvester plot aggregates, keyed by harvester node id
+        self._harvester_cache = {}
+        self._last_snapshot_time = 0
+
+        # collector and clear methods of each independently scheduled group of stats
+        self._sections = {'farmer': (self._collect_farmer_stats, self._clear_farmer_stats),
+                          'blockchain': (self._collect_blockchain_stats, self._clear_blockchain_stats),
+                          'block_time': (self._collect_block_time_stats, self._clear_block_time_stats),
+                          'wallet': (self._collect_wallet_stats, self._clear_wallet_stats)}
+        # block wins only get their own section with the coin_records engine, and the mempool once enabled
+        self._collection_intervals = {section: 30 for section in chia_stats._SECTION_SERVICES}
+        # sections which haven't (yet) completed a successful run
+        self._failed_sections = set(self._sections)
+        self._section_triggers = {}
+        self._breakers = {}
+        self.set_circuit_breakers(3, 10, 600)
+
+        # daemon event stream, used in event mode and for proof lookup stats
+        self._event_listener = None
+        self._event_mode = False
+        self._reconciliation_interval = 600
+        # per-harvester proof lookup histograms, only kept when enabled
+        self.proof_stats = None
+        # notified whenever a section collection completes, e.g. to refresh a cached exposition
+        self._collection_callback = None
+
+        # used by the chiatter watchdog
+        self.error_count = 0
+        self.last_success_time = time.monotonic()
 
         self.harvesters = 0
+        # per-harvester breakdown of the plot stats, keyed by harvester node id
+        self.harvester_stats = {}
         self.plots_duplicates = 0
         self.plots_failed_to_open = 0
         self.plots_no_key = 0
@@ -78,12 +261,18 @@ class chia_stats:
         self.mempool_size = 0
         self.mempool_allocation = 0
         self.full_node_connections = 0
+        # fee rate analytics of the mempool items, as computed by the mempool index
+        self.mempool_stats = {}
         self.og_time_to_win = 0
         self.portable_time_to_win = 0
         self.current_height = 0
         self.wallet_funds = 0
+        # per-wallet balances, keyed by wallet id
+        self.wallet_balances = {}
         self.chia_farmed = 0
         self.blocks_won = 0
+        # [blocks won, farmer rewards, pool rewards] for each halving era, only set by the coin_records engine
+        self.block_win_eras = []
         self.seconds_since_last_win = 0
 
         # defaults to 'WARNING' otherwise
@@ -95,21 +284,121 @@ class chia_stats:
         # logging level for current logger
         logger.setLevel(self._logging_level)
 
-        logger.debug('Loading chia configuration...')
+        if self._node_config is None:
+            self._logger.debug('Loading chia configuration...')
+            self._config = load_chia_config(self._root_path)
+        else:
+            self._config = chia_stats._remote_config(self._node_config)
+        self._apply_config()
 
-        self._config = load_config(DEFAULT_ROOT_PATH, 'config.yaml')
+        # RPC clients are kept alive between collection runs and
+        # are only recreated if their service stops responding
+        self._farmer = None
+        self._fullnode = None
+        self._wallet = None
+        self._client_locks = {}
+        self._client_locks_loop = None
 
+    def _apply_config(self):
         self._hostname = self._config['self_hostname']
         self._farmer_port = self._config['farmer']['rpc_port']
         self._fullnode_port = self._config['full_node']['rpc_port']
         self._wallet_port = self._config['wallet']['rpc_port']
 
-    def clear_stats(self):
-        self._chia_farmed_prev = 0
-        self._seconds_since_last_win_stale = False
-        self._last_win_max_time = 0
+    async def _reload_config(self):
+        # remote nodes are described by the chiatter config, which doesn't change at runtime
+        if self._node_config is not None:
+            return
+
+        try:
+            config = load_chia_config(self._root_path)
+        except Exception as exception:
+            # keep using the last known configuration
+            self._logger.warning(f'Unable to reload chia configuration: {type(exception)} {exception}')
+            return
+
+        if config is self._config:
+            return
+
+        self._logger.info('Chia configuration has changed. Reloading...')
+        endpoints = (self._hostname, self._farmer_port, self._fullnode_port, self._wallet_port)
+        self._config = config
+        self._apply_config()
+
+        # the RPC clients will need to be recreated if any of the endpoints have moved
+        if endpoints != (self._hostname, self._farmer_port, self._fullnode_port, self._wallet_port):
+            await self.close_clients()
+
+    @staticmethod
+    def _remote_config(node_config):
+        # only the parts of a chia config which are needed to reach the RPC and daemon endpoints,
+        # with absolute paths to a copy of the node's private CA and daemon certificates
+        ssl_path = Path(node_config['ssl_path']).expanduser()
+
+        return {'self_hostname': node_config['hostname'],
+                'daemon_port': node_config['daemon_port'],
+                'farmer': {'rpc_port': node_config['farmer_rpc_port']},
+                'full_node': {'rpc_port': node_config['full_node_rpc_port']},
+                'wallet': {'rpc_port': node_config['wallet_rpc_port']},
+                'private_ssl_ca': {'crt': str(ssl_path / 'ca' / 'private_ca.crt'),
+                                   'key': str(ssl_path / 'ca' / 'private_ca.key')},
+                'daemon_ssl': {'private_crt': str(ssl_path / 'daemon' / 'private_daemon.crt'),
+                               'private_key': str(ssl_path / 'daemon' / 'private_daemon.key')}}
+
+    async def _close_client(self, client):
+        try:
+            client.close()
+            await client.await_closed()
+        except Exception as exception:
+            self._logger.debug(f'Unable to cleanly close RPC client: {type(exception)} {exception}')
+
+    async def _get_client(self, client_name, client_class, port):
+        client = getattr(self, client_name)
+        if client is not None:
+            try:
+                await self._rpc(client.healthz())
+                return client
+            except Exception:
+                pass
+
+        # clients are shared by all sections, so reconnects are serialized per client, and locks are
+        # created on first use so that they're bound to the event loop the collections are running on
+        loop = asyncio.get_running_loop()
+        if self._client_locks_loop is not loop:
+            self._client_locks = {}
+            self._client_locks_loop = loop
+        client_lock = self._client_locks.setdefault(client_name, asyncio.Lock())
+
+        async with client_lock:
+            # another section may have already replaced the client in the meantime
+            current_client = getattr(self, client_name)
+            if current_client is not None and current_client is client:
+                self._logger.warning(f'{client_class.__name__} health check failed. Reconnecting...')
+                setattr(self, client_name, None)
+                await self._close_client(client)
+                current_client = None
+
+            if current_client is None:
+                self._logger.debug(f'Creating {client_class.__name__}...')
+                current_client = await client_class.create(self._hostname, port, self._root_path, self._config)
+                setattr(self, client_name, current_client)
+
+            return current_client
+
+    async def close_clients(self):
+        self._logger.info('Closing clients...')
+
+        for client in (self._farmer, self._fullnode, self._wallet):
+            if client is not None:
+                await self._close_client(client)
 
+        self._farmer = None
+        self._fullnode = None
+        self._wallet = None
+
+    def _clear_farmer_stats(self):
         self.harvesters = 0
+        self.harvester_stats = {}
         self.plots_duplicates = 0
         self.plots_failed_to_open = 0
         self.plots_no_key = 0
@@ -120,25 +409,59 @@ class chia_stats:
             self.plots_portable[ksize] = 0
         for clevel in chia_stats._PLOT_COMPRESSION_LEVEL_RANGE:
             self.plots_clevel[clevel] = 0
+
+    def _clear_blockchain_stats(self):
         self.sync_status = False
         self.difficulty = 0
         self.network_space_size = 0
         self.mempool_size = 0
         self.mempool_allocation = 0
         self.full_node_connections = 0
+
+    def _clear_block_time_stats(self):
+        self._average_block_time = 0
+
+    def _clear_mempool_stats(self):
+        # the index is rebuilt from scratch on the next run
+        self._mempool_index.replace({})
+        self._mempool_pending_tx_ids = []
+
+        self.mempool_stats = {}
+
+    def _clear_wallet_stats(self):
+        # block win scanner state is preserved, since it's validated against the wallet on the next scan
+        self._chia_farmed_prev = 0
+        self._seconds_since_last_win_stale = False
+        # forces a refetch of the farmed amount and wallet balances
+        self._wallet_height = None
+
+        self.current_height = 0
+
+    def _clear_block_win_stats(self):
+        # a failed scan may have left a partially indexed height range behind, so the index
+        # gets reloaded from the last fully scanned range saved to disk on the next run
+        self._win_index = None
+
+    def clear_stats(self):
+        self._clear_farmer_stats()
+        self._clear_blockchain_stats()
+        self._clear_block_time_stats()
+        self._clear_mempool_stats()
+        self._clear_wallet_stats()
+        self._clear_block_win_stats()
+
         self.og_time_to_win = 0
         self.portable_time_to_win = 0
-        self.current_height = 0
 
     def set_won_block_transaction_fee(self, won_block_transaction_fee):
         # validate fee amount being between 1 mojo and 1 XCH
         if won_block_transaction_fee < 0.000000000001 or won_block_transaction_fee > 1:
-            logger.warning('XCH_WON_BLOCK_TRANSACTION_FEE is out of bounds. Defaulting to 0.01 XCH.')
+            self._logger.warning('XCH_WON_BLOCK_TRANSACTION_FEE is out of bounds. Defaulting to 0.01 XCH.')
             won_block_transaction_fee = 0.01
         # convert to mojos (1000000000000 mojos = 1 XCH)
         chia_stats._WON_BLOCK_TRANSACTION_FEE = int(won_block_transaction_fee * 1000000000000)
 
-        logger.debug(f'_WON_BLOCK_TRANSACTION_FEE: {chia_stats._WON_BLOCK_TRANSACTION_FEE}')
+        self._logger.debug(f'_WON_BLOCK_TRANSACTION_FEE: {chia_stats._WON_BLOCK_TRANSACTION_FEE}')
 
     def set_contract_address_filter(self, contract_address_filter):
         self._contract_address_filter = contract_address_filter
@@ -146,209 +469,950 @@ class chia_stats:
         decoded_bytes = bech32m.decode_puzzle_hash(self._contract_address_filter)
         self._decoded_puzzle_hash = '0x' + binascii.hexlify(decoded_bytes).decode('utf8')
 
-        logger.debug(f'_decoded_puzzle_hash: {self._decoded_puzzle_hash}')
+        self._logger.debug(f'_decoded_puzzle_hash: {self._decoded_puzzle_hash}')
 
-    async def collect_stats(self):
-        logger.info('***** Starting data collection run *****')
+        # cached plot aggregates were computed using the previous filter
+        self._harvester_cache = {}
 
-        self.harvesters = 0
-        self.plots_duplicates = 0
-        self.plots_failed_to_open = 0
-        self.plots_no_key = 0
-        self.og_size = 0
-        self.portable_size = 0
-        for ksize in chia_stats._PLOT_KSIZE_RANGE:
-            self.plots_og[ksize] = 0
-            self.plots_portable[ksize] = 0
-        for clevel in chia_stats._PLOT_COMPRESSION_LEVEL_RANGE:
-            self.plots_clevel[clevel] = 0
+    def set_collection_intervals(self, collection_intervals):
+        for section, collection_interval in collection_intervals.items():
+            # validate interval being between 1 second and 1 day
+            if collection_interval < 1 or collection_interval > 86400:
+                self._logger.warning(f'{section.upper()}_COLLECTION_INTERVAL is out of bounds. Defaulting to 30 seconds.')
+                collection_interval = 30
+            self._collection_intervals[section] = collection_interval
+
+        self._logger.debug(f'_collection_intervals: {self._collection_intervals}')
+
+    def enable_event_mode(self, reconciliation_interval, daemon_url=None):
+        # validate interval being between 1 minute and 1 day
+        if reconciliation_interval < 60 or reconciliation_interval > 86400:
+            self._logger.warning('RECONCILIATION_INTERVAL is out of bounds. Defaulting to 600 seconds.')
+            reconciliation_interval = 600
+        self._reconciliation_interval = reconciliation_interval
+        self._event_mode = True
+
+        if self._event_listener is None:
+            self._create_event_listener(daemon_url)
+
+        self._logger.debug(f'Event mode enabled, _reconciliation_interval: {self._reconciliation_interval}')
+
+    def enable_mempool_stats(self):
+        self._sections['mempool'] = (self._collect_mempool_stats, self._clear_mempool_stats)
+        self._failed_sections.add('mempool')
+
+        self._logger.debug('Mempool stats enabled')
+
+    def enable_proof_stats(self, daemon_url=None):
+        # farming info is only ever sent over the daemon event stream
+        self.proof_stats = proof_stats()
 
-        logger.info('Initializing clients...')
+        if self._event_listener is None:
+            self._create_event_listener(daemon_url)
 
-        farmer = await FarmerRpcClient.create(self._hostname, self._farmer_port,
-                                              DEFAULT_ROOT_PATH, self._config)
-        fullnode = await FullNodeRpcClient.create(self._hostname, self._fullnode_port,
-                                                  DEFAULT_ROOT_PATH, self._config)
-        wallet = await WalletRpcClient.create(self._hostname, self._wallet_port,
-                                              DEFAULT_ROOT_PATH, self._config)
+        self._logger.debug('Proof lookup stats enabled')
+
+    def _create_event_listener(self, daemon_url):
+        # a custom URL is only meant for testing against a local stand-in daemon, so no TLS is used for ws:// URLs
+        if daemon_url is None:
+            daemon_url = f'wss://{self._hostname}:{self._config["daemon_port"]}'
+        if daemon_url.startswith('wss://'):
+            ssl_context = ssl_context_for_client(self._root_path / self._config['private_ssl_ca']['crt'],
+                                                 self._root_path / self._config['private_ssl_ca']['key'],
+                                                 self._root_path / self._config['daemon_ssl']['private_crt'],
+                                                 self._root_path / self._config['daemon_ssl']['private_key'])
+        else:
+            ssl_context = None
+
+        self._event_listener = chia_events(daemon_url, ssl_context)
+
+        self._logger.debug(f'Listening for daemon events on {daemon_url}')
+
+    def set_rpc_timeout(self, rpc_timeout):
+        # validate timeout being between 1 second and 10 minutes
+        if rpc_timeout < 1 or rpc_timeout > 600:
+            self._logger.warning('RPC_TIMEOUT is out of bounds. Defaulting to 30 seconds.')
+            rpc_timeout = 30
+        self._rpc_timeout = rpc_timeout
+
+        self._logger.debug(f'_rpc_timeout: {self._rpc_timeout}')
+
+    def set_plot_inventory_mode(self, plot_inventory_mode):
+        if plot_inventory_mode not in chia_stats._PLOT_INVENTORY_MODES:
+            self._logger.warning('PLOT_INVENTORY_MODE is invalid. Defaulting to paginated.')
+            plot_inventory_mode = 'paginated'
+        self._plot_inventory_mode = plot_inventory_mode
+
+        self._logger.debug(f'_plot_inventory_mode: {self._plot_inventory_mode}')
+
+    def set_block_win_engine(self, block_win_engine, block_win_start_height):
+        if block_win_engine not in chia_stats._BLOCK_WIN_ENGINES:
+            self._logger.warning('BLOCK_WIN_ENGINE is invalid. Defaulting to transactions.')
+            block_win_engine = 'transactions'
+        self._block_win_engine = block_win_engine
+        # the transactions engine runs as part of the wallet section instead
+        if self._block_win_engine == 'coin_records':
+            self._sections['block_wins'] = (self._collect_block_win_stats, self._clear_block_win_stats)
+            self._failed_sections.add('block_wins')
+        else:
+            self._sections.pop('block_wins', None)
+            self._failed_sections.discard('block_wins')
+        if block_win_start_height < 0:
+            self._logger.warning('BLOCK_WIN_START_HEIGHT is out of bounds. Defaulting to 0.')
+            block_win_start_height = 0
+        self._block_win_start_height = block_win_start_height
+
+        self._logger.debug(f'_block_win_engine: {self._block_win_engine}')
+        self._logger.debug(f'_block_win_start_height: {self._block_win_start_height}')
+
+    def set_circuit_breakers(self, failure_threshold, backoff_min, backoff_max):
+        # validate threshold being between 1 and 100 consecutive failures
+        if failure_threshold < 1 or failure_threshold > 100:
+            self._logger.warning('BREAKER_FAILURE_THRESHOLD is out of bounds. Defaulting to 3.')
+            failure_threshold = 3
+        # validate backoff being between 1 second and 1 day
+        if backoff_min < 1 or backoff_min > 86400:
+            self._logger.warning('BREAKER_BACKOFF_MIN is out of bounds. Defaulting to 10 seconds.')
+            backoff_min = 10
+        if backoff_max < backoff_min or backoff_max > 86400:
+            self._logger.warning('BREAKER_BACKOFF_MAX is out of bounds. Defaulting to 600 seconds.')
+            backoff_max = max(600, backoff_min)
+
+        for service in chia_stats._SECTION_SERVICES.values():
+            self._breakers[service] = circuit_breaker(failure_threshold, backoff_min, backoff_max)
+            chiatter_circuit_breaker_state.labels(self.node_name, service).set(circuit_breaker.CLOSED)
+
+        self._logger.debug(f'Circuit breakers: failure_threshold: {failure_threshold}, '
+                           f'backoff_min: {backoff_min}, backoff_max: {backoff_max}')
+
+    def set_max_concurrent_collections(self, max_concurrent_collections):
+        # validate limit being between 1 and 256 concurrent section collections
+        if max_concurrent_collections < 1 or max_concurrent_collections > 256:
+            self._logger.warning('MAX_CONCURRENT_COLLECTIONS is out of bounds. Defaulting to 8.')
+            max_concurrent_collections = 8
+        chia_stats._max_concurrent_collections = max_concurrent_collections
+
+        self._logger.debug(f'_max_concurrent_collections: {chia_stats._max_concurrent_collections}')
+
+    def set_collection_callback(self, collection_callback):
+        self._collection_callback = collection_callback
+
+    def _config_fingerprint(self):
+        # any of these will alter the collected values, so a snapshot taken with different ones is unusable
+        return [self._hostname, self._farmer_port, self._fullnode_port, self._wallet_port,
+                self._contract_address_filter, chia_stats._WON_BLOCK_TRANSACTION_FEE, self._block_win_engine,
+                self._block_win_start_height]
+
+    def save_snapshot(self):
+        self._last_snapshot_time = time.monotonic()
+
+        snapshot = {'chia_version': chia_version,
+                    'config': self._config_fingerprint(),
+                    'stats': {field: getattr(self, field) for field in chia_stats._SNAPSHOT_FIELDS}}
 
         try:
-            logger.info('Fetching farmer state...')
-            #########################################################
-            # will scrape the local harvester as well as any remote harvesters
-            harvesters = await farmer.get_harvesters()
-
-            for harvester in harvesters['harvesters']:
-                self.harvesters += 1
-
-                self.plots_duplicates += len(harvester['duplicates'])
-                self.plots_failed_to_open += len(harvester['failed_to_open_filenames'])
-                self.plots_no_key += len(harvester['no_key_filenames'])
-
-                for plot in harvester['plots']:
-                    ksize = plot['size'] - chia_stats._PLOT_BASE_KSIZE
-                    clevel = plot['compression_level']
-
-                    # counterintuitively, pool_public key will have a value for OG plots
-                    if plot['pool_public_key'] is not None:
-                        self.og_size += plot['file_size']
-                        self.plots_og[ksize] += 1
-                        # OG plots won't have a compression level
-
-                    # only count plots that match a specific puzzle hash (based on the contract address filter)
-                    elif self._contract_address_filter is not None:
-                        if plot['pool_contract_puzzle_hash'] == self._decoded_puzzle_hash:
-                            self.portable_size += plot['file_size']
-                            self.plots_portable[ksize] += 1
-                            self.plots_clevel[clevel] += 1
-                        else:
-                            logger.debug('Different puzzle hash detected. Skipping plot.')
-                    # if no filter is specified, process all plots, regardless of their puzzle hash
-                    else:
-                        self.portable_size += plot['file_size']
-                        self.plots_portable[ksize] += 1
-                        self.plots_clevel[clevel] += 1
-
-            logger.debug(f'harvesters: {self.harvesters}')
-            logger.debug(f'plots_duplicates: {self.plots_duplicates}')
-            logger.debug(f'plots_failed_to_open: {self.plots_failed_to_open}')
-            logger.debug(f'plots_no_key: {self.plots_no_key}')
-            logger.debug(f'og_size: {self.og_size}')
-            logger.debug(f'portable_size: {self.portable_size}')
-            for ksize in chia_stats._PLOT_KSIZE_RANGE:
-                logger.debug(f'plots_og_k{ksize + chia_stats._PLOT_BASE_KSIZE}: {self.plots_og[ksize]}')
+            write_json_atomically(self._snapshot_file_path, snapshot)
+            self._logger.debug('Saved warm-start snapshot.')
+        except Exception as exception:
+            self._logger.warning(f'Unable to save warm-start snapshot: {type(exception)} {exception}')
+
+    def load_snapshot(self):
+        try:
+            with open(self._snapshot_file_path, 'r') as snapshot_file:
+                snapshot = json.load(snapshot_file)
+
+            if snapshot['chia_version'] != chia_version:
+                self._logger.info('Warm-start snapshot was taken with a different chia version. Ignoring it.')
+                return False
+            if snapshot['config'] != self._config_fingerprint():
+                self._logger.info('Warm-start snapshot was taken with a different configuration. Ignoring it.')
+                return False
+
+            # fails before anything is applied if the snapshot is missing a field
+            stats = {field: snapshot['stats'][field] for field in chia_stats._SNAPSHOT_FIELDS}
+
+        except FileNotFoundError:
+            self._logger.debug('No warm-start snapshot found.')
+            return False
+
+        except Exception as exception:
+            self._logger.warning(f'Unable to load warm-start snapshot: {type(exception)} {exception}')
+            return False
+
+        for field, value in stats.items():
+            setattr(self, field, value)
+
+        if self._last_win_max_time != 0:
+            self.seconds_since_last_win = int(datetime.timestamp(datetime.now())) - self._last_win_max_time
+
+        self._logger.info('Loaded warm-start snapshot.')
+
+        return True
+
+    async def _rpc(self, coroutine, method=None):
+        # raw fetch calls need to name their endpoint, otherwise the name of the client method is used
+        if method is None:
+            method = coroutine.__name__
+
+        start_time = time.perf_counter()
+        try:
+            # each RPC call gets its own timeout, so that a single slow call can't stall a whole section
+            return await asyncio.wait_for(coroutine, self._rpc_timeout)
+        finally:
+            chiatter_rpc_duration.labels(self.node_name, method).observe(time.perf_counter() - start_time)
+
+    async def _fetch_harvester_aggregate(self, node_id):
+        columns = plot_columns(chia_stats._PLOT_BASE_KSIZE, self._decoded_puzzle_hash)
+
+        page = 0
+        page_count = 1
+        # plots are fetched in bounded pages, so a single harvester never yields a huge response
+        while page < page_count:
+            request = {'node_id': node_id, 'page': page, 'page_size': chia_stats._PLOT_PAGE_SIZE}
+            plots_page = await self._rpc(self._farmer.fetch('get_harvester_plots_valid', request),
+                                          'get_harvester_plots_valid')
+
+            columns.extend(plots_page['plots'])
+            chiatter_items_processed.labels(self.node_name, 'farmer').inc(len(plots_page['plots']))
+
+            page_count = plots_page['page_count']
+            page += 1
+
+        return columns.aggregate(chia_stats._PLOT_KSIZES, chia_stats._PLOT_COMPRESSION_LEVELS)
+
+    async def _stream_harvester_aggregates(self):
+        parser = harvester_stream(lambda: plot_columns(chia_stats._PLOT_BASE_KSIZE, self._decoded_puzzle_hash))
+        farmer = self._farmer
+
+        # same request as farmer.get_harvesters(), except the response is never fully held in memory
+        async with farmer.session.post(farmer.url + 'get_harvesters', json={},
+                                       ssl=farmer.ssl_context if farmer.ssl_context is not None else True) as response:
+            response.raise_for_status()
+            async for chunk in response.content.iter_chunked(chia_stats._STREAM_CHUNK_SIZE):
+                parser.feed(chunk)
+
+        response, harvesters = parser.close()
+        if not response['success']:
+            raise ResponseFailureError(response)
+
+        aggregates = {}
+        for harvester, columns in harvesters:
+            chiatter_items_processed.labels(self.node_name, 'farmer').inc(len(columns))
+            aggregates[harvester['connection']['node_id']] = columns.aggregate(chia_stats._PLOT_KSIZES,
+                                                                              chia_stats._PLOT_COMPRESSION_LEVELS)
+
+        return aggregates
+
+    async def _collect_farmer_stats(self):
+        self._logger.info('Fetching farmer state...')
+
+        await self._get_client('_farmer', FarmerRpcClient, self._farmer_port)
+
+        harvesters_count = 0
+        plots_duplicates = 0
+        plots_failed_to_open = 0
+        plots_no_key = 0
+        og_size = 0
+        portable_size = 0
+        plots_og = [0] * chia_stats._PLOT_KSIZES
+        plots_portable = [0] * chia_stats._PLOT_KSIZES
+        plots_clevel = [0] * chia_stats._PLOT_COMPRESSION_LEVELS
+
+        # will scrape the local harvester as well as any remote harvesters, but only plot counts are returned
+        harvesters = await self._rpc(self._farmer.get_harvesters_summary())
+
+        harvester_cache = {}
+        harvester_stats = {}
+        # only used in streaming mode, where all harvesters are fetched at once
+        streamed_aggregates = None
+        for harvester in harvesters['harvesters']:
+            harvesters_count += 1
+
+            node_id = harvester['connection']['node_id']
+            # any change in the plot inventory of a harvester will be reflected in at least one of these
+            sync_state = (harvester['plots'], harvester['total_plot_size'], harvester['last_sync_time'])
+            cached_harvester = self._harvester_cache.get(node_id)
+
+            # keep using the cached values while a harvester is syncing, as its plot list will be incomplete
+            if cached_harvester is not None and (cached_harvester['sync_state'] == sync_state or
+                                                 harvester['syncing'] is not None):
+                self._logger.debug(f'Using cached plot aggregate for harvester {node_id}.')
+            else:
+                self._logger.debug(f'Fetching plots for harvester {node_id}...')
+                aggregate = None
+                if self._plot_inventory_mode == 'streaming':
+                    if streamed_aggregates is None:
+                        streamed_aggregates = await self._rpc(self._stream_harvester_aggregates(), 'get_harvesters')
+                    # harvesters which connected in between requests will be fetched page by page
+                    aggregate = streamed_aggregates.get(node_id)
+                if aggregate is None:
+                    aggregate = await self._fetch_harvester_aggregate(node_id)
+                cached_harvester = {'sync_state': sync_state, 'aggregate': aggregate}
+            harvester_cache[node_id] = cached_harvester
+
+            aggregate = cached_harvester['aggregate']
+            harvester_stats[node_id] = dict(aggregate,
+                                            plots_duplicates=harvester['duplicates'],
+                                            plots_failed_to_open=harvester['failed_to_open_filenames'],
+                                            plots_no_key=harvester['no_key_filenames'])
+
+            plots_duplicates += harvester['duplicates']
+            plots_failed_to_open += harvester['failed_to_open_filenames']
+            plots_no_key += harvester['no_key_filenames']
+            og_size += aggregate['og_size']
+            portable_size += aggregate['portable_size']
             for ksize in chia_stats._PLOT_KSIZE_RANGE:
-                logger.debug(f'plots_portable_k{ksize + chia_stats._PLOT_BASE_KSIZE}: {self.plots_portable[ksize]}')
+                plots_og[ksize] += aggregate['plots_og'][ksize]
+                plots_portable[ksize] += aggregate['plots_portable'][ksize]
             for clevel in chia_stats._PLOT_COMPRESSION_LEVEL_RANGE:
-                logger.debug(f'plots_c{clevel}: {self.plots_clevel[clevel]}')
-            #########################################################
-
-            logger.info('Fetching blockchain state...')
-            #########################################################
-            blockchain = await fullnode.get_blockchain_state()
-
-            self.sync_status = blockchain['sync']['synced']
-            self.difficulty = blockchain['difficulty']
-            self.network_space_size = blockchain['space']
-            self.mempool_size = blockchain['mempool_size']
-            self.mempool_allocation = int((blockchain['mempool_cost'] /
-                                           blockchain['mempool_max_total_cost']) * 100)
-
-            connections = await fullnode.get_connections()
-
-            self.full_node_connections = 0
-            for connection in connections:
-                # only count full node connections (type 1)
-                if connection['type'] == 1:
-                    self.full_node_connections += 1
-
-            average_block_time = await get_average_block_time(self._fullnode_port, DEFAULT_ROOT_PATH)
-
-            if self.og_size != 0:
-                self.og_time_to_win = int((average_block_time) /
-                                          (self.og_size / self.network_space_size))
-            if self.portable_size != 0:
-                self.portable_time_to_win = int((average_block_time) /
-                                                (self.portable_size / self.network_space_size))
-
-            logger.debug(f'sync_status: {self.sync_status}')
-            logger.debug(f'difficulty: {self.difficulty}')
-            logger.debug(f'network_space_size: {self.network_space_size}')
-            logger.debug(f'mempool_size: {self.mempool_size}')
-            logger.debug(f'mempool_allocation: {self.mempool_allocation}')
-            logger.debug(f'full_node_connections: {self.full_node_connections}')
-            logger.debug(f'og_time_to_win: {self.og_time_to_win}')
-            logger.debug(f'portable_time_to_win: {self.portable_time_to_win}')
-            #########################################################
-
-            logger.info('Fetching wallet state...')
-            #########################################################
-            farmed_stat = await wallet.get_farmed_amount()
+                plots_clevel[clevel] += aggregate['plots_clevel'][clevel]
+
+        # disconnected harvesters are dropped from the cache
+        self._harvester_cache = harvester_cache
+
+        # only publish the values once the whole section has been processed
+        self.harvesters = harvesters_count
+        self.plots_duplicates = plots_duplicates
+        self.plots_failed_to_open = plots_failed_to_open
+        self.plots_no_key = plots_no_key
+        self.og_size = og_size
+        self.portable_size = portable_size
+        self.plots_og = plots_og
+        self.plots_portable = plots_portable
+        self.plots_clevel = plots_clevel
+        self.harvester_stats = harvester_stats
+
+        self._logger.debug(f'harvesters: {self.harvesters}')
+        self._logger.debug(f'plots_duplicates: {self.plots_duplicates}')
+        self._logger.debug(f'plots_failed_to_open: {self.plots_failed_to_open}')
+        self._logger.debug(f'plots_no_key: {self.plots_no_key}')
+        self._logger.debug(f'og_size: {self.og_size}')
+        self._logger.debug(f'portable_size: {self.portable_size}')
+        for ksize in chia_stats._PLOT_KSIZE_RANGE:
+            self._logger.debug(f'plots_og_k{ksize + chia_stats._PLOT_BASE_KSIZE}: {self.plots_og[ksize]}')
+        for ksize in chia_stats._PLOT_KSIZE_RANGE:
+            self._logger.debug(f'plots_portable_k{ksize + chia_stats._PLOT_BASE_KSIZE}: {self.plots_portable[ksize]}')
+        for clevel in chia_stats._PLOT_COMPRESSION_LEVEL_RANGE:
+            self._logger.debug(f'plots_c{clevel}: {self.plots_clevel[clevel]}')
+
+        # reward coins are looked up by the block_wins section, but the targets come from the farmer
+        if self._block_win_engine == 'coin_records':
+            self._reward_puzzle_hashes = await self._fetch_reward_puzzle_hashes()
+
+    async def _collect_blockchain_stats(self):
+        self._logger.info('Fetching blockchain state...')
+
+        await self._get_client('_fullnode', FullNodeRpcClient, self._fullnode_port)
+
+        blockchain, connections = await asyncio.gather(
+            self._rpc(self._fullnode.get_blockchain_state()),
+            self._rpc(self._fullnode.get_connections()))
+
+        chiatter_items_processed.labels(self.node_name, 'blockchain').inc(len(connections) + 1)
+
+        full_node_connections = 0
+        for connection in connections:
+            # only count full node connections (type 1)
+            if connection['type'] == 1:
+                full_node_connections += 1
+
+        self.sync_status = blockchain['sync']['synced']
+        self.difficulty = blockchain['difficulty']
+        self.network_space_size = blockchain['space']
+        self.mempool_size = blockchain['mempool_size']
+        self.mempool_allocation = int((blockchain['mempool_cost'] /
+                                       blockchain['mempool_max_total_cost']) * 100)
+        self.full_node_connections = full_node_connections
+
+        self._logger.debug(f'sync_status: {self.sync_status}')
+        self._logger.debug(f'difficulty: {self.difficulty}')
+        self._logger.debug(f'network_space_size: {self.network_space_size}')
+        self._logger.debug(f'mempool_size: {self.mempool_size}')
+        self._logger.debug(f'mempool_allocation: {self.mempool_allocation}')
+        self._logger.debug(f'full_node_connections: {self.full_node_connections}')
+
+    async def _fetch_block_records(self, start, end):
+        # the client's get_block_records() hides errors behind an empty list
+        block_records = await self._rpc(self._fullnode.fetch('get_block_records', {'start': start, 'end': end}),
+                                        'get_block_records')
+
+        chiatter_items_processed.labels(self.node_name, 'block_time').inc(len(block_records['block_records']))
+
+        return block_records['block_records']
+
+    async def _collect_block_time_stats(self):
+        self._logger.info('Fetching average block time...')
+
+        await self._get_client('_fullnode', FullNodeRpcClient, self._fullnode_port)
+
+        blockchain = await self._rpc(self._fullnode.get_blockchain_state())
+        peak = blockchain['peak']
+
+        if peak is None:
+            self._average_block_time = SECONDS_PER_BLOCK
+        else:
+            # only the block records added since the last peak are fetched, if any
+            self._average_block_time = await self._block_time_estimator.update(peak.height, '0x' + peak.header_hash.hex(),
+                                                                               self._fetch_block_records)
+
+        self._logger.debug(f'_average_block_time: {self._average_block_time}')
+
+    @staticmethod
+    def _mempool_item_fee_cost(mempool_item):
+        return mempool_item['fee'], mempool_item['cost']
+
+    async def _fetch_mempool_items(self, tx_ids):
+        item_slots = asyncio.Semaphore(chia_stats._MEMPOOL_ITEM_CONCURRENCY)
+
+        async def fetch_item(tx_id):
+            async with item_slots:
+                try:
+                    mempool_item = await self._rpc(self._fullnode.fetch('get_mempool_item_by_tx_id', {'tx_id': tx_id}),
+                                                   'get_mempool_item_by_tx_id')
+                except ResponseFailureError:
+                    # the item has left the mempool since the ids were fetched
+                    return None
+                return tx_id, chia_stats._mempool_item_fee_cost(mempool_item['mempool_item'])
+
+        mempool_items = await asyncio.gather(*[fetch_item(tx_id) for tx_id in tx_ids])
+
+        return dict(mempool_item for mempool_item in mempool_items if mempool_item is not None)
+
+    async def _collect_mempool_stats(self):
+        self._logger.info('Fetching mempool items...')
+
+        await self._get_client('_fullnode', FullNodeRpcClient, self._fullnode_port)
+
+        # ids are cheap to fetch, and are used to work out what has changed since the last run
+        tx_ids = await self._rpc(self._fullnode.fetch('get_all_mempool_tx_ids', {}), 'get_all_mempool_tx_ids')
+        # ids come with a 0x prefix, which is dropped to keep the index compact
+        tx_ids = {tx_id[2:] if tx_id.startswith('0x') else tx_id for tx_id in tx_ids['tx_ids']}
+
+        removed_tx_ids = [tx_id for tx_id in self._mempool_index.tx_ids() if tx_id not in tx_ids]
+        # items carried over from previous runs are fetched first, so that none of them are left behind indefinitely
+        pending_tx_ids = [tx_id for tx_id in self._mempool_pending_tx_ids if tx_id in tx_ids]
+        carried_over_tx_ids = set(pending_tx_ids)
+        pending_tx_ids.extend(tx_id for tx_id in tx_ids
+                              if tx_id not in self._mempool_index and tx_id not in carried_over_tx_ids)
+
+        added_items = await self._fetch_mempool_items(pending_tx_ids[:chia_stats._MEMPOOL_ITEM_FETCH_LIMIT])
+        self._mempool_index.apply(added_items, removed_tx_ids)
+        self._mempool_pending_tx_ids = pending_tx_ids[chia_stats._MEMPOOL_ITEM_FETCH_LIMIT:]
+        items_processed = len(added_items)
+
+        chiatter_items_processed.labels(self.node_name, 'mempool').inc(items_processed + 1)
+
+        self.mempool_stats = self._mempool_index.stats()
+
+        self._logger.debug(f'mempool_stats: {self.mempool_stats}')
+        self._logger.debug(f'_mempool_pending_tx_ids: {len(self._mempool_pending_tx_ids)}')
+
+    def _reset_win_scan(self):
+        self._win_scan_cursor = 0
+        self._win_scan_last_name = None
+
+        self.blocks_won = 0
+        self._last_win_max_time = 0
+
+    def _load_win_checkpoint(self, wallet_id):
+        self._win_checkpoint_loaded = True
+
+        try:
+            with open(self._win_checkpoint_file_path, 'r') as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+
+            # a checkpoint made for a different wallet or fee delta can't be reused
+            if (checkpoint['wallet_id'] != wallet_id or
+                checkpoint['won_block_transaction_fee'] != chia_stats._WON_BLOCK_TRANSACTION_FEE):
+                self._logger.info('Block win checkpoint does not match the current configuration. Ignoring it.')
+                return
+
+            self._win_scan_cursor = checkpoint['cursor']
+            self._win_scan_last_name = checkpoint['last_name']
+            self.blocks_won = checkpoint['blocks_won']
+            self._last_win_max_time = checkpoint['last_win_max_time']
+
+            self._logger.debug(f'Loaded block win checkpoint at transaction #{self._win_scan_cursor}.')
+
+        except FileNotFoundError:
+            self._logger.debug('No block win checkpoint found. A full scan will be performed.')
+
+        except Exception as exception:
+            self._logger.warning(f'Unable to load block win checkpoint: {type(exception)} {exception}')
+            self._reset_win_scan()
+
+    def _save_win_checkpoint(self, wallet_id):
+        checkpoint = {'wallet_id': wallet_id,
+                      'won_block_transaction_fee': chia_stats._WON_BLOCK_TRANSACTION_FEE,
+                      'cursor': self._win_scan_cursor,
+                      'last_name': self._win_scan_last_name,
+                      'blocks_won': self.blocks_won,
+                      'last_win_max_time': self._last_win_max_time}
+
+        try:
+            write_json_atomically(self._win_checkpoint_file_path, checkpoint)
+        except Exception as exception:
+            self._logger.warning(f'Unable to save block win checkpoint: {type(exception)} {exception}')
+
+    @staticmethod
+    def _won_block_amount(height):
+        # the halving table is sorted, so the applicable amount is the last one at or below the current height
+        halving_index = bisect_right(chia_stats._WON_BLOCK_HALVING_HEIGHTS, height) - 1
+
+        return chia_stats._WON_BLOCK_TRANSACTION_AMOUNTS[max(halving_index, 0)]
+
+    async def _scan_block_wins(self, wallet, wallet_id):
+        if not self._win_checkpoint_loaded:
+            self._load_win_checkpoint(wallet_id)
+
+        # only confirmed transactions are scanned, since these are sorted by confirmation height
+        # and new ones will always be appended at the end of the list
+        wallet_transaction_count = await self._rpc(wallet.get_transaction_count(wallet_id, confirmed=True))
+        self._logger.debug(f'wallet_transaction_count: {wallet_transaction_count}')
+
+        # make sure the last processed transaction is still where we left it, otherwise
+        # the wallet has been resynced or altered and a full rescan is required
+        if self._win_scan_cursor > 0:
+            if wallet_transaction_count < self._win_scan_cursor:
+                checkpoint_valid = False
+            else:
+                last_transaction = await self._rpc(wallet.get_transactions(wallet_id, self._win_scan_cursor - 1,
+                                                                           self._win_scan_cursor, confirmed=True))
+                checkpoint_valid = (len(last_transaction) == 1 and
+                                    last_transaction[0].name.hex() == self._win_scan_last_name)
+
+            if not checkpoint_valid:
+                self._logger.warning('Block win checkpoint is no longer valid. Performing a full rescan.')
+                self._reset_win_scan()
+
+        while self._win_scan_cursor < wallet_transaction_count:
+            page_end = min(self._win_scan_cursor + chia_stats._TRANSACTION_PAGE_SIZE, wallet_transaction_count)
+            self._logger.debug(f'Scanning transactions #{self._win_scan_cursor} to #{page_end}...')
+
+            wallet_transactions = await self._rpc(wallet.get_transactions(wallet_id, self._win_scan_cursor,
+                                                                          page_end, confirmed=True))
+            # the wallet may have been altered in between calls
+            if len(wallet_transactions) == 0:
+                break
+
+            chiatter_items_processed.labels(self.node_name, 'wallet').inc(len(wallet_transactions))
+
+            for transaction_record in wallet_transactions:
+                self._win_scan_cursor += 1
+                # ignore outbound transactions
+                if int(transaction_record.sent) == 0:
+                    won_block_amount = chia_stats._won_block_amount(transaction_record.confirmed_at_height)
+                    amount = int(transaction_record.amount)
+
+                    # use a delta interval to determine a won block, since any transaction fees
+                    # for a won block will be received within the same transaction
+                    if won_block_amount <= amount <= won_block_amount + chia_stats._WON_BLOCK_TRANSACTION_FEE:
+                        self.blocks_won += 1
+                        self._logger.debug(f'Transaction #{self._win_scan_cursor} has a block win share amount.')
+                        current_time = int(transaction_record.created_at_time)
+                        if current_time > self._last_win_max_time:
+                            self._last_win_max_time = current_time
+
+            self._win_scan_last_name = wallet_transactions[-1].name.hex()
+            # persist progress after each page, so that an interrupted scan can be resumed
+            self._save_win_checkpoint(wallet_id)
+
+    def _load_win_index(self, puzzle_hashes):
+        self._win_index = block_win_index(chia_stats._WON_BLOCK_HALVING_HEIGHTS, puzzle_hashes,
+                                          self._block_win_start_height)
+
+        try:
+            with open(self._win_index_file_path, 'r') as index_file:
+                if self._win_index.load_dict(json.load(index_file)):
+                    self._logger.debug(f'Loaded block win index up to height {self._win_index.scanned_height}.')
+                else:
+                    self._logger.info('Block win index does not match the current reward targets. Rebuilding it.')
+
+        except FileNotFoundError:
+            self._logger.debug('No block win index found. It will be built from the start height.')
+
+        except Exception as exception:
+            self._logger.warning(f'Unable to load block win index: {type(exception)} {exception}')
+            self._win_index = block_win_index(chia_stats._WON_BLOCK_HALVING_HEIGHTS, puzzle_hashes,
+                                              self._block_win_start_height)
+
+    def _save_win_index(self):
+        try:
+            write_json_atomically(self._win_index_file_path, self._win_index.to_dict())
+        except Exception as exception:
+            self._logger.warning(f'Unable to save block win index: {type(exception)} {exception}')
+
+    async def _fetch_reward_puzzle_hashes(self):
+        reward_targets, pool_state = await asyncio.gather(self._rpc(self._farmer.get_reward_targets(False)),
+                                                          self._rpc(self._farmer.get_pool_state()))
+
+        farmer_puzzle_hashes = {bech32m.decode_puzzle_hash(reward_targets['farmer_target'])}
+        pool_puzzle_hashes = {bech32m.decode_puzzle_hash(reward_targets['pool_target'])}
+        # pool rewards of plot NFTs are sent to their pool contract instead
+        for pool in pool_state['pool_state']:
+            pool_puzzle_hashes.add(bytes.fromhex(pool['p2_singleton_puzzle_hash'].replace('0x', '')))
+
+        return farmer_puzzle_hashes, pool_puzzle_hashes
+
+    @staticmethod
+    def _reward_coin_type(parent_coin_info, farmer_puzzle_hashes, puzzle_hash):
+        # reward coins have their parent id derived from the genesis challenge and the won block height
+        if parent_coin_info[:16] == DEFAULT_CONSTANTS.GENESIS_CHALLENGE[:16]:
+            return 'pool'
+        if parent_coin_info[:16] == DEFAULT_CONSTANTS.GENESIS_CHALLENGE[16:]:
+            return 'farmer'
+
+        # should only ever happen on other networks
+        return 'farmer' if puzzle_hash in farmer_puzzle_hashes else 'pool'
+
+    async def _collect_block_win_stats(self):
+        self._logger.info('Fetching block win reward coins...')
+
+        await self._get_client('_fullnode', FullNodeRpcClient, self._fullnode_port)
+
+        blockchain = await self._rpc(self._fullnode.get_blockchain_state())
+
+        # the reward targets are fetched by the farmer section, under its own circuit breaker
+        if self._reward_puzzle_hashes is None:
+            self._logger.info('Farmer reward targets are not yet known. Skipping the block win index update.')
+            return
+
+        farmer_puzzle_hashes, pool_puzzle_hashes = self._reward_puzzle_hashes
+        reward_puzzle_hashes = sorted(farmer_puzzle_hashes | pool_puzzle_hashes)
+
+        # the index is rebuilt whenever the reward targets change
+        puzzle_hashes = [puzzle_hash.hex() for puzzle_hash in reward_puzzle_hashes]
+        if self._win_index is None or self._win_index.puzzle_hashes != puzzle_hashes:
+            self._load_win_index(puzzle_hashes)
+
+        peak = blockchain['peak']
+        # only the blocks confirmed since the last run get queried, along with a few recent ones
+        if peak is not None and peak.height != self._win_index.scanned_height:
+            self._win_index.rewind(min(self._win_index.scanned_height, peak.height) + 1 -
+                                   chia_stats._WIN_INDEX_REORG_DEPTH)
+
+            while self._win_index.scanned_height < peak.height:
+                start_height = self._win_index.scanned_height + 1
+                end_height = min(start_height + chia_stats._WIN_INDEX_HEIGHT_RANGE, peak.height + 1)
+                self._logger.debug(f'Scanning reward coins from height {start_height} to {end_height}...')
+
+                coin_records = await self._rpc(self._fullnode.get_coin_records_by_puzzle_hashes(
+                    reward_puzzle_hashes, True, start_height, end_height))
+                chiatter_items_processed.labels(self.node_name, 'block_wins').inc(len(coin_records) + 1)
+
+                for coin_record in coin_records:
+                    # anything else sent to the reward targets isn't a block reward
+                    if not coin_record.coinbase:
+                        continue
+
+                    coin = coin_record.coin
+                    reward_type = chia_stats._reward_coin_type(coin.parent_coin_info, farmer_puzzle_hashes,
+                                                               coin.puzzle_hash)
+                    self._win_index.add_reward(int.from_bytes(coin.parent_coin_info[16:], 'big'),
+                                               coin_record.confirmed_block_index, reward_type, coin.amount,
+                                               coin_record.timestamp)
+
+                self._win_index.scanned_height = end_height - 1
+                # persist progress after each range, so that an interrupted scan can be resumed
+                self._save_win_index()
+
+        self.blocks_won = len(self._win_index)
+        self.block_win_eras = [list(era_stats) for era_stats in self._win_index.era_stats]
+        self._last_win_max_time = self._win_index.last_win_time
+
+        if self._last_win_max_time != 0:
+            self.seconds_since_last_win = int(datetime.timestamp(datetime.now())) - self._last_win_max_time
+        else:
+            self.seconds_since_last_win = 0
+
+        self._logger.debug(f'blocks_won: {self.blocks_won}')
+        self._logger.debug(f'block_win_eras: {self.block_win_eras}')
+        self._logger.debug(f'seconds_since_last_win: {self.seconds_since_last_win}')
+
+    async def _fetch_wallet_balances(self, wallet, wallets):
+        wallet_ids = [wallet_info['id'] for wallet_info in wallets]
+        balance_slots = asyncio.Semaphore(chia_stats._WALLET_BALANCE_CONCURRENCY)
+
+        async def fetch_batch(batch_wallet_ids):
+            async with balance_slots:
+                return await self._rpc(wallet.get_wallet_balances(batch_wallet_ids))
+
+        # balances are fetched in batches of wallets, with a few batches in flight at a time
+        batches = await asyncio.gather(*[fetch_batch(wallet_ids[batch_start:batch_start + chia_stats._WALLET_BALANCE_BATCH_SIZE])
+                                         for batch_start in range(0, len(wallet_ids), chia_stats._WALLET_BALANCE_BATCH_SIZE)])
+
+        wallet_balances = {}
+        for batch in batches:
+            for wallet_balance in batch.values():
+                try:
+                    wallet_type = WalletType(wallet_balance['wallet_type']).name.lower()
+                except ValueError:
+                    wallet_type = str(wallet_balance['wallet_type'])
+                # JSON object keys are strings, so wallet ids are kept as strings throughout
+                wallet_balances[str(wallet_balance['wallet_id'])] = {
+                    'wallet_type': wallet_type,
+                    'confirmed_balance': wallet_balance['confirmed_wallet_balance'],
+                    'spendable_balance': wallet_balance['spendable_balance'],
+                    'unconfirmed_balance': wallet_balance['unconfirmed_wallet_balance']}
+
+        chiatter_items_processed.labels(self.node_name, 'wallet').inc(len(wallet_balances))
+
+        return wallet_balances
+
+    async def _collect_wallet_stats(self):
+        self._logger.info('Fetching wallet state...')
+
+        await self._get_client('_wallet', WalletRpcClient, self._wallet_port)
+        wallet = self._wallet
+
+        current_height = await self._rpc(wallet.get_height_info())
+        self.current_height = current_height.height
+        self._logger.debug(f'current_height: {self.current_height}')
+
+        # farmed amounts, wallets and their balances can only change once the wallet reaches a new height
+        if self.current_height != self._wallet_height:
+            farmed_stat, wallets = await asyncio.gather(self._rpc(wallet.get_farmed_amount()),
+                                                        self._rpc(wallet.get_wallets()))
             self.chia_farmed = farmed_stat['farmed_amount']
             if self.chia_farmed != self._chia_farmed_prev:
                 self._chia_farmed_prev = self.chia_farmed
                 self._seconds_since_last_win_stale = True
 
-            current_height = await wallet.get_height_info()
-            self.current_height = current_height.height
-            main_wallet = await wallet.get_wallets()
-            # assume only one wallet exists - might want to alter it in the future
-            main_wallet_balance = await wallet.get_wallet_balance(main_wallet[0]['id'])
-            self.wallet_funds = main_wallet_balance.get('confirmed_wallet_balance')
-
-            logger.debug(f'chia_farmed: {self.chia_farmed}')
-            logger.debug(f'current_height: {self.current_height}')
-            logger.debug(f'wallet_funds: {self.wallet_funds}')
-
-            # simple transaction-based block win time detection logic
-            if self._seconds_since_last_win_stale:
-                # needed to determine end transaction for the transaction query below
-                wallet_transaction_count = await wallet.get_transaction_count(main_wallet[0]['id'])
-                logger.debug(f'wallet_transaction_count: {wallet_transaction_count}')
-                # 0 to wallet_transaction_count will list all the transactions in the wallet
-                wallet_transactions = await wallet.get_transactions(main_wallet[0]['id'], 0, wallet_transaction_count)
-
-                self.blocks_won = 0
-                current_transaction_no = 0
-                # will be set to 0 on the initial calculation
-                height_selector = -1
-                next_halving_height = 0
-                halving_events_exhausted = False
-                
-                for transaction_record in wallet_transactions:
-                    current_transaction_no += 1
-                    # ignore outbound transactions
-                    if int(transaction_record.sent) == 0:
-                        if not halving_events_exhausted and transaction_record.confirmed_at_height >= next_halving_height:
-                            height_selector += 1
-                            won_block_amount = chia_stats._WON_BLOCK_TRANSACTION_AMOUNTS[height_selector]
-                            logger.debug(f'Won block amount is: {won_block_amount}')
-                            if height_selector == len(chia_stats._WON_BLOCK_HALVING_HEIGHTS) - 1:
-                                logger.debug(f'Halving heights exhausted.')
-                                halving_events_exhausted = True
-                            else:
-                                next_halving_height = chia_stats._WON_BLOCK_HALVING_HEIGHTS[height_selector + 1]
-                                logger.debug(f'Next halving height is: {next_halving_height}')
-                        
-                        # use a delta interval to determine a won block, since any transaction fees
-                        # for a won block will be received within the same transaction
-                        if (int(transaction_record.amount) >= won_block_amount and
-                            int(transaction_record.amount) <= won_block_amount +
-                            chia_stats._WON_BLOCK_TRANSACTION_FEE):
-                            self.blocks_won += 1
-                            logger.debug(f'Transaction #{current_transaction_no} has a block win share amount.')
-                            current_time = int(transaction_record.created_at_time)
-                            if current_time > self._last_win_max_time:
-                                self._last_win_max_time = current_time
-
-                if self._last_win_max_time == 0:
-                    logger.warning('Unable to find a valid block win transaction.')
-
-                self._seconds_since_last_win_stale = False
+            # block wins are credited to the first standard wallet
+            self._main_wallet_id = next((wallet_info['id'] for wallet_info in wallets
+                                         if wallet_info['type'] == WalletType.STANDARD_WALLET), None)
+            self.wallet_balances = await self._fetch_wallet_balances(wallet, wallets)
+            # the other wallets are still reported, even if the standard one is missing (e.g. a fresh key)
+            if self._main_wallet_id is None:
+                self._logger.warning('Unable to find a standard wallet. Main wallet funds will not be reported.')
+                self.wallet_funds = 0
             else:
-                logger.info('Skipping _last_win_max_time update until next block win.')
+                self.wallet_funds = self.wallet_balances[str(self._main_wallet_id)]['confirmed_balance']
 
-            if self._last_win_max_time != 0:
-                self.seconds_since_last_win = int(datetime.timestamp(datetime.now())) - self._last_win_max_time
-            else:
-                self.seconds_since_last_win = 0
+            self._wallet_height = self.current_height
+        else:
+            self._logger.info('Wallet height has not changed. Skipping wallet balance update.')
+
+        self._logger.debug(f'chia_farmed: {self.chia_farmed}')
+        self._logger.debug(f'wallet_funds: {self.wallet_funds}')
+        self._logger.debug(f'wallet_balances: {self.wallet_balances}')
+
+        # simple transaction-based block win time detection logic, unless wins are indexed from reward coins
+        if self._block_win_engine == 'coin_records':
+            self._logger.debug('Block wins are indexed from reward coins. Skipping the transaction scan.')
+        elif self._main_wallet_id is None:
+            # the scan stays pending until a standard wallet shows up
+            self._logger.info('No standard wallet to scan for block wins. Skipping _last_win_max_time update.')
+        elif self._seconds_since_last_win_stale:
+            await self._scan_block_wins(wallet, self._main_wallet_id)
+
+            if self._last_win_max_time == 0:
+                self._logger.warning('Unable to find a valid block win transaction.')
+
+            self._seconds_since_last_win_stale = False
+        else:
+            self._logger.info('Skipping _last_win_max_time update until next block win.')
+
+        if self._last_win_max_time != 0:
+            self.seconds_since_last_win = int(datetime.timestamp(datetime.now())) - self._last_win_max_time
+        else:
+            self.seconds_since_last_win = 0
 
-            logger.debug(f'blocks_won: {self.blocks_won}')
-            logger.debug(f'seconds_since_last_win: {self.seconds_since_last_win}')
-            #########################################################
+        self._logger.debug(f'blocks_won: {self.blocks_won}')
+        self._logger.debug(f'seconds_since_last_win: {self.seconds_since_last_win}')
 
-        except ClientConnectorError:
-            logger.warning('Chia RPC API call failed. Full node may be down.')
+    def _update_time_to_win(self):
+        # depends on the farmer, blockchain and block time sections
+        if self.og_size != 0 and self.network_space_size != 0:
+            self.og_time_to_win = int((self._average_block_time) /
+                                      (self.og_size / self.network_space_size))
+        else:
+            self.og_time_to_win = 0
+        if self.portable_size != 0 and self.network_space_size != 0:
+            self.portable_time_to_win = int((self._average_block_time) /
+                                            (self.portable_size / self.network_space_size))
+        else:
+            self.portable_time_to_win = 0
+
+        self._logger.debug(f'og_time_to_win: {self.og_time_to_win}')
+        self._logger.debug(f'portable_time_to_win: {self.portable_time_to_win}')
+
+    async def collect_section(self, section):
+        # collection slots are shared by all monitored nodes, and are created on first use so that
+        # they're bound to the event loop the collections are running on, which changes on module restarts
+        loop = asyncio.get_running_loop()
+        if chia_stats._collection_slots is None or chia_stats._collection_slots_loop is not loop:
+            chia_stats._collection_slots = asyncio.Semaphore(chia_stats._max_concurrent_collections)
+            chia_stats._collection_slots_loop = loop
+
+        async with chia_stats._collection_slots:
+            await self._reload_config()
+            success = await self._collect_section(section)
+
+        # failed collections clear their section, which is just as much of an update
+        if self._collection_callback is not None:
+            self._collection_callback()
+
+        return success
+
+    async def _collect_section(self, section):
+        collector, clear = self._sections[section]
+        service = chia_stats._SECTION_SERVICES[section]
+        breaker = self._breakers[service]
+
+        # don't keep hammering a service which is down, restarting or struggling to sync
+        allowed = breaker.allow()
+        chiatter_circuit_breaker_state.labels(self.node_name, service).set(breaker.state)
+        if not allowed:
+            self._logger.debug(f'Skipping {section} state, since the {service} circuit breaker is '
+                               f'{circuit_breaker.STATE_NAMES[breaker.state]}.')
+            return False
+
+        start_time = time.perf_counter()
+        try:
+            await collector()
+            self._failed_sections.discard(section)
+            self.last_success_time = time.monotonic()
+            success = True
+
+        except asyncio.TimeoutError as exception:
+            self._logger.warning(f'Chia RPC API call timed out while fetching {section} state.')
+            error_type = type(exception).__name__
+            success = False
+
+        except ClientConnectorError as exception:
+            self._logger.warning(f'Chia RPC API call failed while fetching {section} state. Service may be down.')
+            error_type = type(exception).__name__
+            success = False
 
         except Exception as exception:
-            logger.error(f'Encountered following exception: {type(exception)} {exception}')
+            self._logger.error(f'Encountered following exception while fetching {section} state: {type(exception)} {exception}')
             # uncomment for debugging purposes only
-            #logger.error(traceback.format_exc())
-            raise
+            #self._logger.error(traceback.format_exc())
+            error_type = type(exception).__name__
+            success = False
 
-        finally:
-            farmer.close()
-            fullnode.close()
-            wallet.close()
+        chiatter_section_duration.labels(self.node_name, section).observe(time.perf_counter() - start_time)
+
+        previous_state = breaker.state
+        if success:
+            breaker.record_success()
+            if previous_state != circuit_breaker.CLOSED:
+                self._logger.info(f'The {service} service has recovered. Closing its circuit breaker.')
+        else:
+            breaker.record_failure()
+            if breaker.state == circuit_breaker.OPEN and previous_state != circuit_breaker.OPEN:
+                self._logger.warning(f'Opening the {service} circuit breaker. '
+                                     f'Retrying in {breaker.retry_in():.0f} seconds.')
+                if previous_state == circuit_breaker.CLOSED:
+                    chiatter_circuit_breaker_trips.labels(self.node_name, service).inc()
+        chiatter_circuit_breaker_state.labels(self.node_name, service).set(breaker.state)
+
+        if not success:
+            chiatter_errors.labels(self.node_name, section, error_type).inc()
+            self.error_count += 1
+
+            self._failed_sections.add(section)
+            # only the stats of the failed section are cleared, others will keep their last good values
+            clear()
+
+        self._update_time_to_win()
+
+        return success
+
+    async def collect_stats(self):
+        self._logger.info('***** Starting data collection run *****')
+
+        # farmer, full node and wallet queries are independent of each other, so run them concurrently
+        results = await asyncio.gather(*[self.collect_section(section) for section in self._sections])
+
+        if not any(results):
+            raise Exception('Data collection failed for all sections.')
+
+        # only fully successful runs are worth restoring after a restart
+        if all(results):
+            self.save_snapshot()
+
+        self._logger.info('***** Data collection complete *****')
+
+    def _on_proof_event(self, command, data):
+        if command == 'new_signage_point':
+            self.proof_stats.record_signage_point(data['signage_point']['challenge_chain_sp'], time.monotonic(),
+                                                  data.get('missing_signage_points'))
+        elif command == 'new_farming_info':
+            self.proof_stats.record_farming_info(data['farming_info'], time.monotonic())
+        else:
+            self.proof_stats.remove_harvester(data['node_id'])
+
+    def _on_event(self, origin, command, data):
+        if self.proof_stats is not None and (origin, command) in chia_stats._PROOF_EVENTS:
+            try:
+                self._on_proof_event(command, data)
+            except (KeyError, TypeError) as exception:
+                self._logger.debug(f'Unable to process {command} event: {type(exception)} {exception}')
+
+        # sections are only refreshed by events in event mode
+        if not self._event_mode:
+            return
+
+        section = chia_stats._EVENT_SECTIONS.get((origin, command))
+
+        if section is not None:
+            self._logger.debug(f'Received {command} event from {origin}. Refreshing {section} stats.')
+            self._section_triggers[section].set()
+
+    def _section_interval(self, section):
+        # event-driven sections only need slow reconciliation polling while the event stream is up
+        if (self._event_mode and self._event_listener.connected and
+            section in chia_stats._EVENT_SECTIONS.values()):
+            return max(self._collection_intervals[section], self._reconciliation_interval)
+
+        return self._collection_intervals[section]
+
+    async def _section_scheduler(self, section, stop_event, on_update=None):
+        trigger = self._section_triggers[section]
+
+        while not stop_event.is_set():
+            # any events received during the run will trigger another one
+            trigger.clear()
+
+            success = await self.collect_section(section)
+            if on_update is not None:
+                on_update(section, success)
+
+            # snapshots are only taken while all sections are healthy, and not more often than needed
+            if (not self._failed_sections and
+                time.monotonic() - self._last_snapshot_time >= chia_stats._SNAPSHOT_INTERVAL):
+                self.save_snapshot()
+
+            try:
+                await asyncio.wait_for(trigger.wait(), self._section_interval(section))
+                # coalesce bursts of events (e.g. during a harvester plot sync) into a single run
+                if not stop_event.is_set():
+                    await asyncio.sleep(chia_stats._EVENT_COALESCE_DELAY)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _wake_on_stop(self, stop_event):
+        await stop_event.wait()
+
+        for trigger in self._section_triggers.values():
+            trigger.set()
+
+    async def run_event_listener(self, stop_event):
+        if self._event_listener is not None:
+            await self._event_listener.run(stop_event, self._on_event)
+
+    async def run_scheduler(self, stop_event, on_update=None):
+        self._logger.info('***** Starting scheduled data collection *****')
+
+        self._section_triggers = {section: asyncio.Event() for section in self._sections}
+
+        # each section runs as an independent task, so slow sections will never delay faster ones
+        tasks = [self._section_scheduler(section, stop_event, on_update) for section in self._sections]
+        tasks.append(self._wake_on_stop(stop_event))
+        tasks.append(self.run_event_listener(stop_event))
+
+        await asyncio.gather(*tasks)
 
-        logger.info('***** Data collection complete *****')
+        self._logger.info('***** Scheduled data collection stopped *****')
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+'''
+@author: Winter Snowfall
+@version: 3.50
+@date: 04/08/2025
+
+Warning: Built for use with python 3.6+
+'''
+
+import logging
+import asyncio
+import threading
+import time
+from itertools import accumulate
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily, HistogramMetricFamily
+from modules.mempool_index import mempool_index
+from modules.proof_stats import proof_stats
+
+# log through the chia_stats logger (and its file handler)
+logger = logging.getLogger('modules.chia_stats.collector')
+
+class chia_stats_collector:
+    '''expose chia_stats values to Prometheus, directly from the chia_stats state of each node'''
+
+    _PLOT_BASE_KSIZE = 32
+    # starts at k32 and goes up to k41 (should be enough
+    # even for the k-raziest of plotters out there)
+    _PLOT_KSIZE_RANGE = range(10)
+    # will cater for C0 to C9, although only compression
+    # levels up to C7 are oficialy supported
+    _PLOT_COMPRESSION_LEVEL_RANGE = range(10)
+
+    # node level gauges, as (metric name, description, chia_stats attribute)
+    _GAUGES = (('chia_stats_harvesters', 'Number of connected harvesters, as seen by the farmer', 'harvesters'),
+               ('chia_stats_duplicate_plots', 'Number of duplicate plots across all harvesters', 'plots_duplicates'),
+               ('chia_stats_failed_to_open_plots', 'Number of plots with access errors across all harvesters',
+                'plots_failed_to_open'),
+               ('chia_stats_no_key_plots', 'Number of plots without a valid key across all harvesters', 'plots_no_key'),
+               ('chia_stats_og_size', 'Total size of og plots', 'og_size'),
+               ('chia_stats_og_time_to_win', 'OG time to win', 'og_time_to_win'),
+               ('chia_stats_portable_size', 'Total size of portable plots', 'portable_size'),
+               ('chia_stats_portable_time_to_win', 'Portable time to win', 'portable_time_to_win'),
+               ('chia_stats_sync_status', 'Blockchain synced status', 'sync_status'),
+               ('chia_stats_difficulty', 'Current difficulty on mainnet', 'difficulty'),
+               ('chia_stats_current_height', 'Current blockchain height', 'current_height'),
+               ('chia_stats_chia_farmed', 'XCH farmed', 'chia_farmed'),
+               ('chia_stats_wallet_funds', 'Funds present in the main chia wallet', 'wallet_funds'),
+               ('chia_stats_network_space_size', 'Total network space', 'network_space_size'),
+               ('chia_stats_mempool_size', 'Total size of the mempool', 'mempool_size'),
+               ('chia_stats_mempool_allocation', 'Percentage of total mempool which is in use', 'mempool_allocation'),
+               ('chia_stats_full_node_connections', 'Number of full node connections', 'full_node_connections'),
+               ('chia_stats_blocks_won', 'Number of blocks won by the farmer', 'blocks_won'),
+               ('chia_stats_seconds_since_last_win', 'Number of seconds since last block win (farmer)',
+                'seconds_since_last_win'))
+
+    def __init__(self, chia_stats_insts):
+        # one chia_stats instance per monitored node
+        self._chia_stats_insts = chia_stats_insts
+
+        # only used in scrape mode
+        self._loop = None
+        self._cache_ttl = None
+        self._collection_timeout = None
+        self._collection_lock = threading.Lock()
+        self._collection_future = None
+        self._last_collection_time = None
+
+    def enable_scrape_mode(self, loop, cache_ttl, collection_timeout):
+        # collections will be triggered by scrapes and run on the given event loop
+        self._loop = loop
+        self._cache_ttl = cache_ttl
+        self._collection_timeout = collection_timeout
+
+        logger.debug(f'Scrape mode enabled, _cache_ttl: {self._cache_ttl}')
+
+    def _on_collection_done(self, future):
+        with self._collection_lock:
+            self._last_collection_time = time.monotonic()
+            self._collection_future = None
+
+    async def _collect_nodes(self):
+        # a failing node must not prevent the others from being collected
+        results = await asyncio.gather(*[chia_stats_inst.collect_stats() for chia_stats_inst in self._chia_stats_insts],
+                                       return_exceptions=True)
+
+        for chia_stats_inst, result in zip(self._chia_stats_insts, results):
+            if isinstance(result, Exception):
+                logger.warning(f'Scrape-triggered collection failed for node {chia_stats_inst.node_name}: '
+                               f'{type(result)} {result}')
+
+    def _refresh(self):
+        with self._collection_lock:
+            if (self._last_collection_time is not None and
+                time.monotonic() - self._last_collection_time < self._cache_ttl):
+                return
+
+            # concurrent scrapes will all wait on the same in-flight collection
+            if self._collection_future is None:
+                logger.debug('Cached values have expired. Starting a new collection...')
+                self._collection_future = asyncio.run_coroutine_threadsafe(self._collect_nodes(), self._loop)
+                self._collection_future.add_done_callback(self._on_collection_done)
+
+            collection_future = self._collection_future
+
+        try:
+            collection_future.result(self._collection_timeout)
+        except Exception as exception:
+            # whatever values are available will still be served
+            logger.warning(f'Scrape-triggered collection failed: {type(exception)} {exception}')
+
+    def describe(self):
+        # avoids a collection being triggered on registration
+        return []
+
+    def collect(self):
+        if self._loop is not None:
+            self._refresh()
+
+        for name, documentation, attribute in chia_stats_collector._GAUGES:
+            gauge = GaugeMetricFamily(name, documentation, labels=['node'])
+            for stats in self._chia_stats_insts:
+                gauge.add_metric([stats.node_name], getattr(stats, attribute))
+            yield gauge
+
+        for ksize in chia_stats_collector._PLOT_KSIZE_RANGE:
+            ksize_label = f'k{ksize + chia_stats_collector._PLOT_BASE_KSIZE}'
+            og_plots = GaugeMetricFamily(f'chia_stats_og_plots_{ksize_label}', f'Number of og {ksize_label} plots',
+                                         labels=['node'])
+            portable_plots = GaugeMetricFamily(f'chia_stats_portable_plots_{ksize_label}',
+                                               f'Number of portable {ksize_label} plots', labels=['node'])
+            for stats in self._chia_stats_insts:
+                og_plots.add_metric([stats.node_name], stats.plots_og[ksize])
+                portable_plots.add_metric([stats.node_name], stats.plots_portable[ksize])
+            yield og_plots
+            yield portable_plots
+        # OG plots won't have a compression level
+        for clevel in chia_stats_collector._PLOT_COMPRESSION_LEVEL_RANGE:
+            plots_compression_level = GaugeMetricFamily(f'chia_stats_plots_compression_level_c{clevel}',
+                                                        f'Number of C{clevel} compressed plots', labels=['node'])
+            for stats in self._chia_stats_insts:
+                plots_compression_level.add_metric([stats.node_name], stats.plots_clevel[clevel])
+            yield plots_compression_level
+
+        yield from self._collect_harvesters()
+        yield from self._collect_proof_stats()
+        yield from self._collect_wallets()
+        yield from self._collect_block_wins()
+        yield from self._collect_mempool()
+
+    def _collect_harvesters(self):
+        # per-harvester plots, labeled by node and harvester node id
+        plots = GaugeMetricFamily('chia_stats_harvester_plots', 'Number of valid plots on the harvester',
+                                  labels=['node', 'node_id'])
+        duplicate_plots = GaugeMetricFamily('chia_stats_harvester_duplicate_plots', 'Number of duplicate plots on the harvester',
+                                            labels=['node', 'node_id'])
+        failed_to_open_plots = GaugeMetricFamily('chia_stats_harvester_failed_to_open_plots',
+                                                 'Number of plots with access errors on the harvester', labels=['node', 'node_id'])
+        no_key_plots = GaugeMetricFamily('chia_stats_harvester_no_key_plots', 'Number of plots without a valid key on the harvester',
+                                         labels=['node', 'node_id'])
+        og_size = GaugeMetricFamily('chia_stats_harvester_og_size', 'Total size of og plots on the harvester',
+                                    labels=['node', 'node_id'])
+        portable_size = GaugeMetricFamily('chia_stats_harvester_portable_size', 'Total size of portable plots on the harvester',
+                                          labels=['node', 'node_id'])
+        og_plots = GaugeMetricFamily('chia_stats_harvester_og_plots', 'Number of og plots on the harvester, by k-size',
+                                     labels=['node', 'node_id', 'ksize'])
+        portable_plots = GaugeMetricFamily('chia_stats_harvester_portable_plots', 'Number of portable plots on the harvester, by k-size',
+                                           labels=['node', 'node_id', 'ksize'])
+        plots_compression_level = GaugeMetricFamily('chia_stats_harvester_plots_compression_level',
+                                                    'Number of compressed plots on the harvester, by compression level',
+                                                    labels=['node', 'node_id', 'clevel'])
+
+        for stats in self._chia_stats_insts:
+            node = stats.node_name
+            for node_id, harvester in stats.harvester_stats.items():
+                plots.add_metric([node, node_id], harvester['plots'])
+                duplicate_plots.add_metric([node, node_id], harvester['plots_duplicates'])
+                failed_to_open_plots.add_metric([node, node_id], harvester['plots_failed_to_open'])
+                no_key_plots.add_metric([node, node_id], harvester['plots_no_key'])
+                og_size.add_metric([node, node_id], harvester['og_size'])
+                portable_size.add_metric([node, node_id], harvester['portable_size'])
+                for ksize in chia_stats_collector._PLOT_KSIZE_RANGE:
+                    ksize_label = f'k{ksize + chia_stats_collector._PLOT_BASE_KSIZE}'
+                    og_plots.add_metric([node, node_id, ksize_label], harvester['plots_og'][ksize])
+                    portable_plots.add_metric([node, node_id, ksize_label], harvester['plots_portable'][ksize])
+                for clevel in chia_stats_collector._PLOT_COMPRESSION_LEVEL_RANGE:
+                    plots_compression_level.add_metric([node, node_id, f'c{clevel}'], harvester['plots_clevel'][clevel])
+
+        return (plots, duplicate_plots, failed_to_open_plots, no_key_plots, og_size, portable_size,
+                og_plots, portable_plots, plots_compression_level)
+
+    @staticmethod
+    def _histogram_buckets(bounds, bucket_counts):
+        # proof_stats keeps per-bucket counts, while Prometheus expects cumulative ones
+        return list(zip([str(float(bound)) for bound in bounds] + ['+Inf'], accumulate(bucket_counts)))
+
+    def _collect_proof_stats(self):
+        # per-harvester proof lookup histograms, labeled by node and harvester node id
+        lookup_time = HistogramMetricFamily('chia_stats_harvester_lookup_time_seconds',
+                                            'Time taken by the harvester to look up proofs for a signage point',
+                                            labels=['node', 'node_id'])
+        response_time = HistogramMetricFamily('chia_stats_harvester_response_time_seconds',
+                                              'Time between a signage point and the harvester farming info reaching the farmer',
+                                              labels=['node', 'node_id'])
+        passed_filter = HistogramMetricFamily('chia_stats_harvester_plots_passed_filter',
+                                              'Number of harvester plots passing the plot filter per signage point',
+                                              labels=['node', 'node_id'])
+        proofs = CounterMetricFamily('chia_stats_harvester_proofs', 'Number of proofs found by the harvester',
+                                     labels=['node', 'node_id'])
+        missing_signage_points = CounterMetricFamily('chia_stats_missing_signage_points',
+                                                     'Number of signage points missed by the farmer', labels=['node'])
+
+        for stats in self._chia_stats_insts:
+            if stats.proof_stats is None:
+                continue
+
+            node = stats.node_name
+            missing_signage_points.add_metric([node], stats.proof_stats.missing_signage_points)
+            # harvesters can come and go while events are being processed
+            for node_id, harvester in list(stats.proof_stats.harvesters.items()):
+                lookup_time.add_metric([node, node_id],
+                                       chia_stats_collector._histogram_buckets(proof_stats.LOOKUP_TIME_BUCKETS,
+                                                                               harvester['lookup_time_buckets']),
+                                       harvester['lookup_time_sum'])
+                response_time.add_metric([node, node_id],
+                                         chia_stats_collector._histogram_buckets(proof_stats.RESPONSE_TIME_BUCKETS,
+                                                                                 harvester['response_time_buckets']),
+                                         harvester['response_time_sum'])
+                passed_filter.add_metric([node, node_id],
+                                         chia_stats_collector._histogram_buckets(proof_stats.PASSED_FILTER_BUCKETS,
+                                                                                 harvester['passed_filter_buckets']),
+                                         harvester['passed_filter_sum'])
+                proofs.add_metric([node, node_id], harvester['proofs'])
+
+        return (lookup_time, response_time, passed_filter, proofs, missing_signage_points)
+
+    def _collect_wallets(self):
+        # per-wallet balances, labeled by node, wallet id and wallet type
+        confirmed_balance = GaugeMetricFamily('chia_stats_wallet_confirmed_balance', 'Confirmed balance of the wallet',
+                                              labels=['node', 'wallet_id', 'wallet_type'])
+        spendable_balance = GaugeMetricFamily('chia_stats_wallet_spendable_balance', 'Spendable balance of the wallet',
+                                              labels=['node', 'wallet_id', 'wallet_type'])
+        unconfirmed_balance = GaugeMetricFamily('chia_stats_wallet_unconfirmed_balance', 'Unconfirmed balance of the wallet',
+                                                labels=['node', 'wallet_id', 'wallet_type'])
+
+        for stats in self._chia_stats_insts:
+            for wallet_id, wallet in stats.wallet_balances.items():
+                labels = [stats.node_name, wallet_id, wallet['wallet_type']]
+                confirmed_balance.add_metric(labels, wallet['confirmed_balance'])
+                spendable_balance.add_metric(labels, wallet['spendable_balance'])
+                unconfirmed_balance.add_metric(labels, wallet['unconfirmed_balance'])
+
+        return (confirmed_balance, spendable_balance, unconfirmed_balance)
+
+    def _collect_block_wins(self):
+        # per halving era win counts and rewards, labeled by node and era (0 before the first halving)
+        blocks_won = GaugeMetricFamily('chia_stats_blocks_won_by_era', 'Number of blocks won by the farmer, per halving era',
+                                       labels=['node', 'era'])
+        rewards = GaugeMetricFamily('chia_stats_block_win_rewards', 'Block rewards received by the farmer and pool targets, per halving era',
+                                    labels=['node', 'era', 'reward'])
+
+        # only populated when block wins are indexed from reward coins
+        for stats in self._chia_stats_insts:
+            for era, (era_blocks_won, farmer_rewards, pool_rewards) in enumerate(stats.block_win_eras):
+                blocks_won.add_metric([stats.node_name, str(era)], era_blocks_won)
+                rewards.add_metric([stats.node_name, str(era), 'farmer'], farmer_rewards)
+                rewards.add_metric([stats.node_name, str(era), 'pool'], pool_rewards)
+
+        return (blocks_won, rewards)
+
+    def _collect_mempool(self):
+        # fee rate analytics of the mempool items, labeled by node
+        items = GaugeMetricFamily('chia_stats_mempool_items', 'Number of items in the mempool', labels=['node'])
+        fees = GaugeMetricFamily('chia_stats_mempool_fees', 'Total fees of the mempool items', labels=['node'])
+        cost = GaugeMetricFamily('chia_stats_mempool_cost', 'Total cost of the mempool items', labels=['node'])
+        fee_per_cost = HistogramMetricFamily('chia_stats_mempool_fee_per_cost', 'Fee per cost of the mempool items',
+                                             labels=['node'])
+        fee_per_cost_percentile = GaugeMetricFamily('chia_stats_mempool_fee_per_cost_percentile',
+                                                    'Fee per cost percentiles of the mempool items', labels=['node', 'percentile'])
+        cost_per_bucket = GaugeMetricFamily('chia_stats_mempool_cost_by_fee_per_cost',
+                                            'Cumulative cost of the mempool items, by fee per cost upper bound',
+                                            labels=['node', 'le'])
+        min_fee_per_cost = GaugeMetricFamily('chia_stats_mempool_min_fee_per_cost',
+                                             'Estimated minimum fee per cost for inclusion in the next block', labels=['node'])
+        min_fee = GaugeMetricFamily('chia_stats_mempool_min_fee',
+                                    'Estimated minimum fee of a standard transaction for inclusion in the next block',
+                                    labels=['node'])
+
+        bucket_bounds = [str(float(bound)) for bound in mempool_index.FEE_PER_COST_BUCKETS] + ['+Inf']
+
+        for stats in self._chia_stats_insts:
+            mempool_stats = stats.mempool_stats
+            # nothing to report until the mempool has been collected
+            if not mempool_stats:
+                continue
+
+            node = stats.node_name
+            items.add_metric([node], mempool_stats['items'])
+            fees.add_metric([node], mempool_stats['fees'])
+            cost.add_metric([node], mempool_stats['cost'])
+            fee_per_cost.add_metric([node], list(zip(bucket_bounds, mempool_stats['fee_per_cost_buckets'] + [mempool_stats['items']])),
+                                    mempool_stats['fee_per_cost_sum'])
+            for percentile, value in mempool_stats['fee_per_cost_percentiles'].items():
+                fee_per_cost_percentile.add_metric([node, str(percentile)], value)
+            for bucket_bound, bucket_cost in zip(bucket_bounds, mempool_stats['fee_per_cost_bucket_costs'] + [mempool_stats['cost']]):
+                cost_per_bucket.add_metric([node, bucket_bound], bucket_cost)
+            min_fee_per_cost.add_metric([node], mempool_stats['min_fee_per_cost'])
+            min_fee.add_metric([node], mempool_stats['min_fee'])
+
+        return (items, fees, cost, fee_per_cost, fee_per_cost_percentile, cost_per_bucket, min_fee_per_cost, min_fee)
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+'''
+@author: Winter Snowfall
+@version: 3.50
+@date: 04/08/2025
+
+Warning: Built for use with python 3.6+
+'''
+
+import logging
+import asyncio
+import time
+import os
+import json
+
+# log through the chia_stats logger (and its file handler)
+logger = logging.getLogger('modules.chia_stats.module')
+
+# the node described by the local chia config.yaml
+LOCAL_NODE_NAME = 'local'
+
+# state files block
+HISTORY_FILE_PATH = os.path.join('..', 'state', 'chia_stats_history.json')
+
+class chia_stats_module:
+    '''chiatter module wrapping the chia_stats instances of all monitored nodes'''
+
+    _COLLECTION_SECTIONS = ('farmer', 'blockchain', 'block_time', 'mempool', 'wallet', 'block_wins')
+    # the heavy imports pulled in on setup, in the order they are profiled by --profile-startup
+    STARTUP_IMPORTS = ('aiohttp', 'chia.util.config', 'chia.rpc.full_node_rpc_client', 'chia.rpc.farmer_rpc_client',
+                       'chia.rpc.wallet_rpc_client', 'chia.cmds.farm_funcs', 'modules.chia_stats',
+                       'modules.chia_stats_collector', 'modules.stats_history')
+
+    def __init__(self, config_parser):
+        # only the configuration is parsed here, since chia gets imported
+        # on setup, inside of whichever worker will be running the module
+        chia_stats_section = config_parser['CHIA_STATS']
+        self._logging_level = chia_stats_section.get('logging_level')
+        # the chia_stats logger only gets its level once chia_stats is set up, which is too late for the warnings below
+        logger.setLevel(self._logging_level)
+
+        collection_interval = chia_stats_section.getint('collection_interval')
+        # each group of stats can have its own cadence, otherwise the general collection interval is used
+        self._collection_intervals = {section: chia_stats_section.getint(f'{section}_collection_interval',
+                                                                         fallback=collection_interval)
+                                      for section in chia_stats_module._COLLECTION_SECTIONS}
+        self._xch_won_block_transaction_fee = chia_stats_section.getfloat('xch_won_block_transaction_fee')
+        self._contract_address_filter = chia_stats_section.get('contract_address_filter').strip()
+        self._rpc_timeout = chia_stats_section.getint('rpc_timeout')
+        self._plot_inventory_mode = chia_stats_section.get('plot_inventory_mode').strip()
+        self._block_win_engine = chia_stats_section.get('block_win_engine').strip()
+        self._block_win_start_height = chia_stats_section.getint('block_win_start_height')
+        self._breaker_failure_threshold = chia_stats_section.getint('breaker_failure_threshold')
+        self._breaker_backoff_min = chia_stats_section.getint('breaker_backoff_min')
+        self._breaker_backoff_max = chia_stats_section.getint('breaker_backoff_max')
+        self._collection_mode = chia_stats_section.get('collection_mode').strip()
+        self._reconciliation_interval = chia_stats_section.getint('reconciliation_interval')
+        self._daemon_url = chia_stats_section.get('daemon_url').strip()
+        self._mempool_stats = chia_stats_section.getboolean('mempool_stats')
+        self._proof_stats = chia_stats_section.getboolean('proof_stats')
+        self._scrape_cache_ttl = chia_stats_section.getint('scrape_cache_ttl')
+        self._max_concurrent_collections = chia_stats_section.getint('max_concurrent_collections')
+        # the local node is monitored by default, otherwise each node needs its own [CHIA_STATS_NODE name] section
+        self._nodes = [node.strip() for node in chia_stats_section.get('nodes').split(',') if node.strip() != '']
+        if len(self._nodes) == 0:
+            self._nodes = [LOCAL_NODE_NAME]
+        self._node_configs = {}
+        for node in self._nodes:
+            if node != LOCAL_NODE_NAME:
+                node_section = config_parser[f'CHIA_STATS_NODE {node}']
+                self._node_configs[node] = {'hostname': node_section.get('hostname').strip(),
+                                            'farmer_rpc_port': node_section.getint('farmer_rpc_port'),
+                                            'full_node_rpc_port': node_section.getint('full_node_rpc_port'),
+                                            'wallet_rpc_port': node_section.getint('wallet_rpc_port'),
+                                            'daemon_port': node_section.getint('daemon_port'),
+                                            'ssl_path': node_section.get('ssl_path').strip()}
+        self._history = chia_stats_section.getboolean('history')
+        # the history is only served locally by default, since it's not meant to be exposed like the metrics
+        self._history_host = chia_stats_section.get('history_host').strip()
+        self._history_port = chia_stats_section.getint('history_port')
+        self._history_sample_interval = chia_stats_section.getint('history_sample_interval')
+        self._history_snapshot_interval = chia_stats_section.getint('history_snapshot_interval')
+        self.worker_mode = chia_stats_section.get('worker').strip()
+
+        # scrape-triggered collections need to run next to the HTTP server
+        if self.worker_mode == 'process' and self._collection_mode == 'scrape':
+            logger.warning('The scrape collection mode can only run in a thread worker. Defaulting to thread.')
+            self.worker_mode = 'thread'
+
+        # raw samples need to fit evenly within the downsampled resolutions
+        if self._history_sample_interval not in (1, 2, 3, 4, 5, 6, 10, 12, 15, 20, 30, 60):
+            logger.warning('HISTORY_SAMPLE_INTERVAL needs to evenly divide a minute. Defaulting to 10.')
+            self._history_sample_interval = 10
+
+        self._chia_stats_insts = []
+        self._collector = None
+        self._collection_callback = None
+        # stats_history instances, keyed by node name
+        self._histories = {}
+
+    def setup(self):
+        from modules.chia_stats import chia_stats
+        from modules.chia_stats_collector import chia_stats_collector
+
+        # each node gets its own chia_stats instance, with its own clients and state
+        self._chia_stats_insts = []
+        for node in self._nodes:
+            logger.info(f'Monitoring chia node: {node}')
+            chia_stats_inst = chia_stats(self._logging_level, node, self._node_configs.get(node))
+            chia_stats_inst.set_won_block_transaction_fee(self._xch_won_block_transaction_fee)
+            chia_stats_inst.set_collection_intervals(self._collection_intervals)
+            chia_stats_inst.set_rpc_timeout(self._rpc_timeout)
+            chia_stats_inst.set_plot_inventory_mode(self._plot_inventory_mode)
+            chia_stats_inst.set_block_win_engine(self._block_win_engine, self._block_win_start_height)
+            chia_stats_inst.set_circuit_breakers(self._breaker_failure_threshold, self._breaker_backoff_min,
+                                                 self._breaker_backoff_max)
+            chia_stats_inst.set_max_concurrent_collections(self._max_concurrent_collections)
+            chia_stats_inst.set_collection_callback(self._collection_callback)
+            # a custom daemon URL only applies to the local node
+            daemon_url = self._daemon_url if self._daemon_url != '' and node == LOCAL_NODE_NAME else None
+            if self._collection_mode == 'events':
+                chia_stats_inst.enable_event_mode(self._reconciliation_interval, daemon_url)
+            if self._mempool_stats:
+                chia_stats_inst.enable_mempool_stats()
+            if self._proof_stats:
+                chia_stats_inst.enable_proof_stats(daemon_url)
+            if self._contract_address_filter != '':
+                chia_stats_inst.set_contract_address_filter(self._contract_address_filter)
+            # serve the last known values until the first collection run completes
+            chia_stats_inst.load_snapshot()
+            self._chia_stats_insts.append(chia_stats_inst)
+
+        # metrics are read directly from the chia_stats state whenever Prometheus scrapes
+        self._collector = chia_stats_collector(self._chia_stats_insts)
+
+        if self._history:
+            self._setup_history()
+
+    def _setup_history(self):
+        from modules.stats_history import stats_history
+
+        self._histories = {chia_stats_inst.node_name: stats_history(self._history_sample_interval)
+                           for chia_stats_inst in self._chia_stats_insts}
+
+        # history from a previous run is kept, as long as it was taken with the same settings
+        try:
+            with open(HISTORY_FILE_PATH, 'r') as history_file:
+                snapshot = json.load(history_file)
+            for node, history in self._histories.items():
+                if node in snapshot and not history.load_dict(snapshot[node]):
+                    logger.info(f'Discarding the stats history of node {node}, since its settings have changed.')
+        except FileNotFoundError:
+            pass
+        except Exception as exception:
+            logger.warning(f'Could not load the stats history: {type(exception)} {exception}')
+
+    def _save_history(self):
+        from modules.chia_stats import write_json_atomically
+
+        try:
+            write_json_atomically(HISTORY_FILE_PATH, {node: history.to_dict()
+                                                      for node, history in self._histories.items()})
+            logger.debug('Saved the stats history.')
+        except Exception as exception:
+            logger.warning(f'Could not save the stats history: {type(exception)} {exception}')
+
+    async def _run_history(self, stop_event):
+        from modules.history_server import history_server
+
+        server = history_server(self._histories, self._history_host, self._history_port)
+        # the history is optional, so it's still sampled (and saved) without an endpoint, e.g. if the port is taken
+        try:
+            await server.start()
+        except OSError as exception:
+            logger.warning(f'Unable to serve the stats history on {self._history_host}:{self._history_port}: {exception}')
+            server = None
+        last_snapshot_time = time.monotonic()
+
+        try:
+            while not stop_event.is_set():
+                try:
+                    await asyncio.wait_for(stop_event.wait(), self._history_sample_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+                # wall clock time is used, since it's meant to be read outside of chiatter
+                timestamp = time.time()
+                for chia_stats_inst in self._chia_stats_insts:
+                    self._histories[chia_stats_inst.node_name].sample(chia_stats_inst, timestamp)
+
+                if (self._history_snapshot_interval > 0 and
+                    time.monotonic() - last_snapshot_time >= self._history_snapshot_interval):
+                    last_snapshot_time = time.monotonic()
+                    self._save_history()
+
+        finally:
+            if server is not None:
+                await server.stop()
+            if self._history_snapshot_interval > 0:
+                self._save_history()
+
+    def set_collection_callback(self, collection_callback):
+        # needs to be set ahead of setup, which passes it on to all chia_stats instances
+        self._collection_callback = collection_callback
+
+    def collector(self):
+        return self._collector
+
+    def error_count(self):
+        return sum(chia_stats_inst.error_count for chia_stats_inst in self._chia_stats_insts)
+
+    def last_success_time(self):
+        # a single unreachable node isn't critical, as long as the others are still being collected
+        return max((chia_stats_inst.last_success_time for chia_stats_inst in self._chia_stats_insts),
+                   default=time.monotonic())
+
+    def run(self, terminate_event):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        stop_event = asyncio.Event()
+
+        async def relay_terminate_event():
+            # terminate_event is a threading (or multiprocessing) event, so it can't be awaited directly
+            await loop.run_in_executor(None, terminate_event.wait)
+            stop_event.set()
+
+        # the stats history gets sampled and served on this event loop as well
+        history_tasks = [self._run_history(stop_event)] if self._history else []
+
+        try:
+            # you'll have to excuse me here, but I simply h8 asyncio
+            if self._collection_mode == 'scrape':
+                # collections will be triggered by Prometheus scrapes, and run on this event loop
+                self._collector.enable_scrape_mode(loop, self._scrape_cache_ttl, self._rpc_timeout)
+                # daemon events (e.g. for proof lookup stats) still need to be listened to in the meantime
+                loop.run_until_complete(asyncio.gather(relay_terminate_event(), *history_tasks,
+                                                       *[chia_stats_inst.run_event_listener(stop_event)
+                                                         for chia_stats_inst in self._chia_stats_insts]))
+            else:
+                # each node runs its own schedulers, so a slow node can't delay the others
+                loop.run_until_complete(asyncio.gather(relay_terminate_event(), *history_tasks,
+                                                       *[chia_stats_inst.run_scheduler(stop_event)
+                                                         for chia_stats_inst in self._chia_stats_insts]))
+
+        finally:
+            # anything left running after a crash gets cancelled, so that the module can be restarted cleanly
+            pending_tasks = asyncio.all_tasks(loop)
+            for pending_task in pending_tasks:
+                pending_task.cancel()
+            loop.run_until_complete(asyncio.gather(*pending_tasks, return_exceptions=True))
+            # the RPC clients are persistent, so they need to be closed on the way out
+            for chia_stats_inst in self._chia_stats_insts:
+                loop.run_until_complete(chia_stats_inst.close_clients())
+            loop.close()
+            asyncio.set_event_loop(None)
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+'''
+@author: Winter Snowfall
+@version: 3.50
+@date: 04/08/2025
+
+Warning: Built for use with python 3.6+
+'''
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# chiatter's own health and performance metrics, as opposed to the collected chia stats
+
+# RPC calls on a local node should take milliseconds, but can stretch to many seconds on a struggling one
+RPC_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COLLECTION_DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+chiatter_rpc_duration = Histogram('chiatter_rpc_duration_seconds', 'Duration of chia RPC calls, by node and method',
+                                  ['node', 'method'], buckets=RPC_DURATION_BUCKETS)
+# sections are collected on their own cadence, so there is no collection cycle to time outside of scrape mode
+chiatter_section_duration = Histogram('chiatter_section_duration_seconds', 'Duration of a chia_stats section collection, by node',
+                                      ['node', 'section'], buckets=COLLECTION_DURATION_BUCKETS)
+chiatter_items_processed = Counter('chiatter_items_processed', 'Number of items (plots, transactions, etc.) processed, by node and section',
+                                   ['node', 'section'])
+chiatter_errors = Counter('chiatter_errors', 'Number of collection errors, by node, section and exception type',
+                          ['node', 'section', 'exception'])
+chiatter_circuit_breaker_state = Gauge('chiatter_circuit_breaker_state',
+                                       'State of the chia RPC service circuit breaker (0 - closed, 1 - half-open, 2 - open)',
+                                       ['node', 'service'])
+chiatter_circuit_breaker_trips = Counter('chiatter_circuit_breaker_trips', 'Number of times a chia RPC service circuit breaker opened',
+                                         ['node', 'service'])
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+'''
+@author: Winter Snowfall
+@version: 3.50
+@date: 04/08/2025
+
+Warning: Built for use with python 3.6+
+'''
+
+import random
+import time
+
+class circuit_breaker:
+    '''stop calling a failing service for a while, backing off exponentially between probes'''
+
+    CLOSED = 0
+    HALF_OPEN = 1
+    OPEN = 2
+
+    STATE_NAMES = {CLOSED: 'closed', HALF_OPEN: 'half-open', OPEN: 'open'}
+
+    def __init__(self, failure_threshold=3, backoff_min=10, backoff_max=600):
+        self._failure_threshold = failure_threshold
+        self._backoff_min = backoff_min
+        self._backoff_max = backoff_max
+
+        self._failures = 0
+        self._backoff = backoff_min
+        self._retry_time = 0
+        # only a single probe is let through while half-open
+        self._probing = False
+
+        self.state = circuit_breaker.CLOSED
+
+    def allow(self):
+        if self.state == circuit_breaker.CLOSED:
+            return True
+
+        if self.state == circuit_breaker.OPEN and time.monotonic() >= self._retry_time:
+            self.state = circuit_breaker.HALF_OPEN
+            self._probing = False
+
+        if self.state == circuit_breaker.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+
+        return False
+
+    def retry_in(self):
+        return max(self._retry_time - time.monotonic(), 0)
+
+    def record_success(self):
+        self.state = circuit_breaker.CLOSED
+        self._failures = 0
+        self._backoff = self._backoff_min
+        self._probing = False
+
+    def record_failure(self):
+        self._failures += 1
+
+        # a failed probe doubles the backoff, otherwise the breaker opens once enough failures pile up
+        if self.state == circuit_breaker.HALF_OPEN:
+            self._backoff = min(self._backoff * 2, self._backoff_max)
+            self._open()
+        elif self.state == circuit_breaker.CLOSED and self._failures >= self._failure_threshold:
+            self._backoff = self._backoff_min
+            self._open()
+
+    def _open(self):
+        self.state = circuit_breaker.OPEN
+        self._probing = False
+        # jitter avoids having all the services of a node (or all nodes) being probed in lockstep
+        self._retry_time = time.monotonic() + self._backoff * random.uniform(0.5, 1)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+'''
+@author: Winter Snowfall
+@version: 3.50
+@date: 04/08/2025
+
+Warning: Built for use with python 3.6+
+'''
+
+import logging
+import asyncio
+import threading
+import hashlib
+import gzip
+from aiohttp import web
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+
+logger = logging.getLogger(__name__)
+
+class exposition_server:
+    '''serve a pre-serialized and compressed exposition, refreshed whenever collections complete'''
+
+    # compression is only paid for once per refresh, so it can afford to be thorough
+    _GZIP_COMPRESSION_LEVEL = 9
+
+    def __init__(self, registry, port, refresh_interval):
+        self._registry = registry
+        self._port = port
+        # also refresh periodically, since not all metrics are tied to a collection
+        self._refresh_interval = refresh_interval
+
+        self._loop = None
+        self._thread = None
+        self._runner = None
+        self._refresh_task = None
+        self._refresh_pending = False
+        # (payload, compressed payload, etag), swapped as a whole on every refresh
+        self._exposition = None
+
+    def start(self):
+        ready = threading.Event()
+        startup_errors = []
+
+        def run_loop():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._loop.run_until_complete(self._start_server())
+            except Exception as exception:
+                startup_errors.append(exception)
+                ready.set()
+                return
+            ready.set()
+            self._loop.run_forever()
+
+            pending_tasks = asyncio.all_tasks(self._loop)
+            for pending_task in pending_tasks:
+                pending_task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*pending_tasks, return_exceptions=True))
+            self._loop.run_until_complete(self._runner.cleanup())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run_loop, daemon=True)
+        self._thread.start()
+        ready.wait()
+
+        if len(startup_errors) > 0:
+            raise startup_errors[0]
+
+    def stop(self):
+        if self._loop is not None and self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def invalidate(self):
+        # can be called from any thread, e.g. once a collection has completed
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._schedule_refresh)
+
+    async def _start_server(self):
+        app = web.Application()
+        app.router.add_get('/', self._handle)
+        app.router.add_get('/metrics', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, port=self._port).start()
+
+        self._schedule_refresh()
+        self._loop.create_task(self._refresh_periodically())
+
+    async def _refresh_periodically(self):
+        while True:
+            await asyncio.sleep(self._refresh_interval)
+            self._schedule_refresh()
+
+    def _schedule_refresh(self):
+        # refreshes requested while one is running are coalesced into a single follow-up refresh
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_pending = True
+        else:
+            self._refresh_task = self._loop.create_task(self._refresh())
+
+    async def _refresh(self):
+        while True:
+            self._refresh_pending = False
+            try:
+                # serialization runs off the event loop, so that scrapes are still served in the meantime
+                self._exposition = await self._loop.run_in_executor(None, self._serialize)
+            except Exception as exception:
+                logger.error(f'Could not serialize the exposition: {type(exception)} {exception}')
+            if not self._refresh_pending:
+                break
+
+    def _serialize(self):
+        payload = generate_latest(self._registry)
+        # identical payloads get identical etags, so unchanged metrics won't need to be sent again
+        etag = f'"{hashlib.blake2b(payload, digest_size=16).hexdigest()}"'
+
+        return (payload, gzip.compress(payload, compresslevel=exposition_server._GZIP_COMPRESSION_LEVEL), etag)
+
+    async def _handle(self, request):
+        if self._exposition is None:
+            # the first scrape may arrive before the initial refresh has completed
+            await asyncio.shield(self._refresh_task)
+            if self._exposition is None:
+                raise web.HTTPServiceUnavailable()
+
+        payload, compressed_payload, etag = self._exposition
+        headers = {'ETag': etag, 'Vary': 'Accept-Encoding'}
+
+        if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+            return web.Response(status=304, headers=headers)
+
+        headers['Content-Type'] = CONTENT_TYPE_LATEST
+        # the cached bytes are sent as they are, without any per-request serialization or compression
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            headers['Content-Encoding'] = 'gzip'
+            return web.Response(body=compressed_payload, headers=headers)
+
+        return web.Response(body=payload, headers=headers)
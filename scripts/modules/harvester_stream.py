@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+'''
+@author: Winter Snowfall
+@version: 3.50
+@date: 04/08/2025
+
+Warning: Built for use with python 3.6+
+'''
+
+import codecs
+import json
+import re
+
+class harvester_stream:
+    '''incrementally parse a get_harvesters response, aggregating plots as they are decoded'''
+
+    # marks the start of a harvester's plot list
+    _PLOTS_START = re.compile(r'"plots"\s*:\s*\[')
+    # enough trailing characters to catch a plot list start which straddles two chunks
+    _PLOTS_START_HOLDBACK = 64
+    _PLOT_SEPARATORS = ' \t\n\r,'
+    # plots are handed over in batches, so that decoded plots never pile up
+    _PLOT_BATCH_SIZE = 1000
+
+    def __init__(self, new_columns):
+        # called to get an empty plot_columns instance for each harvester
+        self._new_columns = new_columns
+
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ''
+        # everything but the plots, which is small enough to be decoded as a whole at the end
+        self._skeleton = []
+        self._columns = []
+        # set while inside a plot list
+        self._current_columns = None
+        self._plot_batch = []
+
+    def _flush_plots(self):
+        self._current_columns.extend(self._plot_batch)
+        self._plot_batch = []
+
+    def _parse(self):
+        buffer = self._buffer
+        position = 0
+
+        while True:
+            if self._current_columns is None:
+                plots_start = harvester_stream._PLOTS_START.search(buffer, position)
+
+                if plots_start is None:
+                    holdback_position = max(position, len(buffer) - harvester_stream._PLOTS_START_HOLDBACK)
+                    self._skeleton.append(buffer[position:holdback_position])
+                    position = holdback_position
+                    break
+
+                # the plot list is left empty in the skeleton
+                self._skeleton.append(buffer[position:plots_start.end()])
+                position = plots_start.end()
+                self._current_columns = self._new_columns()
+
+            else:
+                while position < len(buffer) and buffer[position] in harvester_stream._PLOT_SEPARATORS:
+                    position += 1
+
+                if position == len(buffer):
+                    break
+
+                # the closing bracket will be picked up by the skeleton
+                if buffer[position] == ']':
+                    self._flush_plots()
+                    self._columns.append(self._current_columns)
+                    self._current_columns = None
+                    continue
+
+                try:
+                    plot, position = self._json_decoder.raw_decode(buffer, position)
+                except ValueError:
+                    # the plot is incomplete, so wait for the next chunk
+                    break
+
+                self._plot_batch.append(plot)
+                if len(self._plot_batch) >= harvester_stream._PLOT_BATCH_SIZE:
+                    self._flush_plots()
+
+        self._buffer = buffer[position:]
+
+    def feed(self, chunk):
+        self._buffer += self._text_decoder.decode(chunk)
+        self._parse()
+
+    def close(self):
+        self._buffer += self._text_decoder.decode(b'', final=True)
+        self._parse()
+
+        if self._current_columns is not None:
+            raise ValueError('Truncated or malformed plot list in get_harvesters response.')
+
+        self._skeleton.append(self._buffer)
+        response = json.loads(''.join(self._skeleton))
+
+        if 'harvesters' in response and len(response['harvesters']) != len(self._columns):
+            raise ValueError('Unexpected number of plot lists in get_harvesters response.')
+
+        # harvesters are returned with empty plot lists, alongside the aggregated columns of their plots
+        return response, list(zip(response.get('harvesters', []), self._columns))
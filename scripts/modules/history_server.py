@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+'''
+@author: Winter Snowfall
+@version: 3.50
+@date: 04/08/2025
+
+Warning: Built for use with python 3.6+
+'''
+
+import logging
+from aiohttp import web
+from modules.stats_history import stats_history
+
+logger = logging.getLogger(__name__)
+
+class history_server:
+    '''serve the stats history of all monitored nodes as JSON, from the event loop of the module'''
+
+    def __init__(self, histories, host, port):
+        # stats_history instances, keyed by node name
+        self._histories = histories
+        self._host = host
+        self._port = port
+
+        self._runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/history', self._handle_index)
+        app.router.add_get('/history/{node}', self._handle_node)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host=self._host, port=self._port).start()
+
+        logger.debug(f'History server started on {self._host}:{self._port}')
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle_index(self, request):
+        return web.json_response({'nodes': list(self._histories.keys()),
+                                  'series': list(stats_history.SERIES),
+                                  'resolutions': [name for name, _, _ in stats_history.RESOLUTIONS]})
+
+    async def _handle_node(self, request):
+        history = self._histories.get(request.match_info['node'])
+        if history is None:
+            raise web.HTTPNotFound(text='Unknown node')
+
+        resolution = request.query.get('resolution', 'raw')
+        series = request.query.get('series')
+        if series is not None:
+            series = [series_name.strip() for series_name in series.split(',') if series_name.strip() != '']
+        try:
+            since = float(request.query['since']) if 'since' in request.query else None
+            return web.json_response(history.query(resolution, series, since))
+        except KeyError:
+            raise web.HTTPBadRequest(text='Unknown resolution')
+        except ValueError:
+            raise web.HTTPBadRequest(text='Invalid series or since value')
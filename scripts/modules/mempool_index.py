@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+'''
+@author: Winter Snowfall
+@version: 3.50
+@date: 04/08/2025
+
+Warning: Built for use with python 3.6+
+'''
+
+from bisect import bisect_left, bisect_right
+from math import ceil
+from itertools import accumulate
+from operator import truediv
+
+class mempool_index:
+    '''in-memory index of mempool item fees and costs, with fee rate analytics'''
+
+    # fee per cost (mojos per cost unit) histogram bucket bounds
+    FEE_PER_COST_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+    PERCENTILES = (0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+
+    def __init__(self, block_max_cost, reference_cost):
+        # cost available to mempool items in a block, and the cost of a typical transaction
+        self._block_max_cost = block_max_cost
+        self._reference_cost = reference_cost
+
+        # (fee, cost) of each mempool item, keyed by transaction id
+        self._items = {}
+        self._stats = None
+
+    def __contains__(self, tx_id):
+        return tx_id in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def tx_ids(self):
+        return self._items.keys()
+
+    def apply(self, added_items, removed_tx_ids):
+        for tx_id in removed_tx_ids:
+            self._items.pop(tx_id, None)
+        self._items.update(added_items)
+
+        # stats are only recomputed once the index has changed
+        if len(added_items) > 0 or len(removed_tx_ids) > 0:
+            self._stats = None
+
+    def replace(self, items):
+        self._items = items
+        self._stats = None
+
+    def stats(self):
+        if self._stats is None:
+            self._stats = self._compute_stats()
+
+        return self._stats
+
+    def _compute_stats(self):
+        # zero cost items can't exist in a mempool, but would break the fee rate math
+        items = [item for item in self._items.values() if item[1] > 0]
+        fees = [fee for fee, cost in items]
+        costs = [cost for fee, cost in items]
+
+        # sort items by fee rate, so that everything else is a matter of bisecting and prefix sums
+        fee_per_cost_items = sorted(zip(map(truediv, fees, costs), costs))
+        fee_per_cost = [item[0] for item in fee_per_cost_items]
+        cost_prefix_sums = [0] + list(accumulate(item[1] for item in fee_per_cost_items))
+        total_cost = cost_prefix_sums[-1]
+
+        # cumulative item counts and costs per fee rate bucket, the same way Prometheus histograms work
+        bucket_counts = [bisect_right(fee_per_cost, bound) for bound in mempool_index.FEE_PER_COST_BUCKETS]
+        bucket_costs = [cost_prefix_sums[bucket_count] for bucket_count in bucket_counts]
+
+        percentiles = {percentile: fee_per_cost[int(percentile * (len(fee_per_cost) - 1))] if len(fee_per_cost) > 0 else 0
+                       for percentile in mempool_index.PERCENTILES}
+
+        # the highest fee rate items get into the next block first, so a new item will need to
+        # beat the fee rate of the item which would be sitting at the block cost limit
+        if total_cost <= self._block_max_cost:
+            min_fee_per_cost = 0
+        else:
+            boundary = bisect_left(cost_prefix_sums, total_cost - self._block_max_cost)
+            min_fee_per_cost = fee_per_cost[min(boundary, len(fee_per_cost) - 1)]
+
+        return {'items': len(fee_per_cost),
+                'fees': sum(fees),
+                'cost': total_cost,
+                'fee_per_cost_sum': sum(fee_per_cost),
+                'fee_per_cost_buckets': bucket_counts,
+                'fee_per_cost_bucket_costs': bucket_costs,
+                'fee_per_cost_percentiles': percentiles,
+                'min_fee_per_cost': min_fee_per_cost,
+                'min_fee': ceil(min_fee_per_cost * self._reference_cost)}
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+'''
+@author: Winter Snowfall
+@version: 3.50
+@date: 04/08/2025
+
+Warning: Built for use with python 3.6+
+'''
+
+import importlib
+
+# chiatter modules which can be enabled in the config, as (python module, module class),
+# and which only get imported once they are actually listed under [GENERAL] modules
+MODULES = {'chia_stats': ('modules.chia_stats_module', 'chia_stats_module')}
+
+def load_module(module_name):
+    try:
+        python_module, module_class = MODULES[module_name]
+    except KeyError:
+        raise ValueError(f'Unknown chiatter module: {module_name}')
+
+    return getattr(importlib.import_module(python_module), module_class)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+'''
+@author: Winter Snowfall
+@version: 3.50
+@date: 04/08/2025
+
+Warning: Built for use with python 3.6+
+'''
+
+import logging
+import importlib
+import threading
+import multiprocessing
+import queue
+import signal
+import time
+from configparser import ConfigParser
+from prometheus_client import REGISTRY, PROCESS_COLLECTOR, PLATFORM_COLLECTOR, GC_COLLECTOR
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from modules.module_registry import load_module
+from modules.startup_profiler import startup_profile
+
+logger = logging.getLogger(__name__)
+# logging level for current logger
+logger.setLevel(logging.INFO)
+
+# seconds between metric reports sent by process workers
+REPORT_INTERVAL = 5
+
+def run_module_process(module_name, config, report_queue, terminate_event):
+    # SIGINT and SIGTERM are handled by the parent, which will signal the terminate_event instead,
+    # since a process manager like systemd will usually send them to the whole process group
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    config_parser = ConfigParser()
+    config_parser.read_dict(config)
+    module = load_module(module_name)(config_parser)
+    module.setup()
+
+    # the parent process exposes its own process and runtime metrics
+    for collector in (PROCESS_COLLECTOR, PLATFORM_COLLECTOR, GC_COLLECTOR):
+        REGISTRY.unregister(collector)
+    REGISTRY.register(module.collector())
+
+    def report_metrics():
+        while not terminate_event.wait(REPORT_INTERVAL):
+            # the metrics of the module and any of its own instrumentation are
+            # sent over, alongside what the watchdog needs to keep an eye on it
+            report = (list(REGISTRY.collect()), module.error_count(), time.monotonic() - module.last_success_time())
+            try:
+                report_queue.put(report, timeout=REPORT_INTERVAL)
+            except queue.Full:
+                pass
+
+    threading.Thread(target=report_metrics, daemon=True).start()
+    module.run(terminate_event)
+
+class module_worker:
+    '''run a chiatter module in a thread or a subprocess, restarting it if it crashes'''
+
+    WORKER_MODES = ('thread', 'process')
+
+    def __init__(self, module_name, config_parser, restart_delay_min, restart_delay_max):
+        self._module_name = module_name
+        self._config_parser = config_parser
+        self._restart_delay_min = restart_delay_min
+        self._restart_delay_max = restart_delay_max
+
+        # the module class is light, with any heavy imports being deferred until setup
+        with startup_profile.measure(module_name, 'load module'):
+            self._module = load_module(module_name)(config_parser)
+        self._worker_mode = self._module.worker_mode
+        if self._worker_mode not in module_worker.WORKER_MODES:
+            logger.warning(f'Invalid worker mode for the {module_name} module. Defaulting to thread.')
+            self._worker_mode = 'thread'
+
+        self._terminate_event = None
+        self._supervisor_thread = None
+        # used in process mode only
+        self._process_context = multiprocessing.get_context('spawn')
+        self._process_terminate_event = None
+        self._families = []
+        self._error_count = 0
+        self._last_success_time = time.monotonic()
+        # notified whenever the metrics of the module have changed
+        self._update_callback = None
+
+        # set until the module has been set up and has metrics to report
+        self.initializing = True
+        self.restarts = 0
+        # start of the current run of crashes, with no stable run of the module in between
+        self.crashing_since = None
+
+    def error_count(self):
+        if self._worker_mode == 'thread':
+            return self._module.error_count()
+
+        return self._error_count
+
+    def last_success_time(self):
+        if self._worker_mode == 'thread':
+            return self._module.last_success_time()
+
+        return self._last_success_time
+
+    def set_update_callback(self, update_callback):
+        self._update_callback = update_callback
+        # thread workers collect in this process, so collections can be tracked directly
+        self._module.set_collection_callback(update_callback)
+
+    def _notify_update(self):
+        if self._update_callback is not None:
+            self._update_callback()
+
+    def describe(self):
+        # avoids a collection being triggered on registration
+        return []
+
+    def collect(self):
+        restarts = CounterMetricFamily('chiatter_module_restarts', 'Number of times the module was restarted after a crash',
+                                       labels=['module'])
+        restarts.add_metric([self._module_name], self.restarts)
+        yield restarts
+        initializing = GaugeMetricFamily('chiatter_module_initializing', 'Whether the module is still initializing',
+                                         labels=['module'])
+        initializing.add_metric([self._module_name], self.initializing)
+        yield initializing
+
+        if self._worker_mode == 'thread':
+            collector = self._module.collector()
+            if collector is not None:
+                yield from collector.collect()
+        else:
+            # the last metrics reported by the subprocess
+            yield from self._families
+
+    def start(self, terminate_event):
+        self._terminate_event = terminate_event
+
+        logger.info(f'*** Loading the {self._module_name} module ({self._worker_mode} worker) ***')
+        # thread workers import their dependencies on the calling thread, since objects created by chia's
+        # native extensions on import can't be dropped by a thread other than their own, while the setup
+        # itself is left to the supervisor, so that it gets restarted like any other failure
+        if self._worker_mode == 'thread':
+            try:
+                with startup_profile.measure(self._module_name, 'imports'):
+                    for module_name in self._module.STARTUP_IMPORTS:
+                        importlib.import_module(module_name)
+            except Exception as exception:
+                logger.error(f'Unable to import the dependencies of the {self._module_name} module: '
+                             f'{type(exception)} {exception}')
+        self._supervisor_thread = threading.Thread(target=self._supervise, daemon=True)
+        self._supervisor_thread.start()
+
+    def profile_startup(self):
+        # imports are profiled one by one, followed by the rest of the setup, all within the current process
+        startup_profile.import_modules(self._module_name, self._module.STARTUP_IMPORTS)
+        with startup_profile.measure(self._module_name, 'setup'):
+            self._module.setup()
+
+    def join(self):
+        if self._process_terminate_event is not None:
+            self._process_terminate_event.set()
+        # the agent may be stopped before the worker has even been started
+        if self._supervisor_thread is not None:
+            self._supervisor_thread.join()
+
+    def _run_thread(self):
+        with startup_profile.measure(self._module_name, 'setup' if self.restarts == 0 else 'restart setup'):
+            self._module.setup()
+        self.initializing = False
+        self._notify_update()
+        self._module.run(self._terminate_event)
+
+    def _run_process(self):
+        # sections are passed on as plain dicts, which is all the subprocess needs to rebuild the config
+        config = {section: dict(self._config_parser[section]) for section in self._config_parser.sections()}
+        report_queue = self._process_context.Queue(maxsize=2)
+        self._process_terminate_event = self._process_context.Event()
+
+        process = self._process_context.Process(target=run_module_process,
+                                                args=(self._module_name, config, report_queue,
+                                                      self._process_terminate_event),
+                                                daemon=True)
+        process.start()
+
+        while process.is_alive() or not report_queue.empty():
+            if self._terminate_event.is_set():
+                self._process_terminate_event.set()
+            try:
+                families, self._error_count, seconds_since_success = report_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            # the monotonic clock isn't necessarily shared with the subprocess
+            self._last_success_time = time.monotonic() - seconds_since_success
+            self._families = families
+            self.initializing = False
+            self._notify_update()
+
+        process.join()
+        if process.exitcode != 0 and not self._terminate_event.is_set():
+            raise Exception(f'Module process exited with code {process.exitcode}')
+
+    def _supervise(self):
+        restart_delay = self._restart_delay_min
+
+        while not self._terminate_event.is_set():
+            start_time = time.monotonic()
+            try:
+                if self._worker_mode == 'thread':
+                    self._run_thread()
+                else:
+                    self._run_process()
+            except Exception as exception:
+                logger.error(f'The {self._module_name} module has crashed: {type(exception)} {exception}')
+            else:
+                # a module will only return normally once it's being terminated
+                break
+
+            # a module which has been running for a while gets the shortest restart delay again
+            if time.monotonic() - start_time > self._restart_delay_max:
+                restart_delay = self._restart_delay_min
+                self.crashing_since = None
+            if self.crashing_since is None:
+                self.crashing_since = time.monotonic()
+
+            logger.warning(f'Restarting the {self._module_name} module in {restart_delay} seconds...')
+            if self._terminate_event.wait(restart_delay):
+                break
+
+            restart_delay = min(restart_delay * 2, self._restart_delay_max)
+            self.restarts += 1
+            self._notify_update()
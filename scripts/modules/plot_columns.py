@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+'''
+@author: Winter Snowfall
+@version: 3.50
+@date: 04/08/2025
+
+Warning: Built for use with python 3.6+
+'''
+
+from array import array
+from itertools import compress
+
+# byte columns are processed as a whole, by treating them as arbitrarily large integers,
+# which keeps all the per-plot work inside the interpreter's C code
+def _to_int(column):
+    return int.from_bytes(column, 'little')
+
+def _to_bytes(value, length):
+    return value.to_bytes(length, 'little')
+
+def _masked_counts(column, mask, values):
+    # column values will be below 64, so setting the 7th bit of each byte according to
+    # the mask can't overlap with them - masked values can then be counted directly
+    keyed = _to_bytes(_to_int(column) | (_to_int(mask) << 6), len(column))
+
+    return [keyed.count(64 + value) for value in values]
+
+class plot_columns:
+    '''compact columnar storage and batched aggregation of plot attributes'''
+
+    def __init__(self, base_ksize, puzzle_hash_filter=None):
+        self._base_ksize = base_ksize
+        self._puzzle_hash_filter = puzzle_hash_filter
+
+        # raw k-sizes are stored, since they all fit within a byte
+        self.ksize = bytearray()
+        self.clevel = bytearray()
+        self.file_size = array('Q')
+        self.og = bytearray()
+        self.puzzle_hash_match = bytearray()
+
+    def __len__(self):
+        return len(self.ksize)
+
+    def extend(self, plots):
+        puzzle_hash_filter = self._puzzle_hash_filter
+
+        self.ksize.extend([plot['size'] for plot in plots])
+        self.clevel.extend([plot['compression_level'] for plot in plots])
+        self.file_size.extend([plot['file_size'] for plot in plots])
+        # counterintuitively, pool_public key will have a value for OG plots
+        self.og.extend([plot['pool_public_key'] is not None for plot in plots])
+        # if no filter is specified, all plots will match, regardless of their puzzle hash
+        if puzzle_hash_filter is None:
+            self.puzzle_hash_match.extend(b'\x01' * len(plots))
+        else:
+            self.puzzle_hash_match.extend([plot['pool_contract_puzzle_hash'] == puzzle_hash_filter
+                                           for plot in plots])
+
+    def aggregate(self, ksizes, clevels):
+        ksize_values = range(self._base_ksize, self._base_ksize + ksizes)
+        # portable plots are non-OG plots which also match the puzzle hash filter
+        portable = _to_bytes(_to_int(self.puzzle_hash_match) & ~_to_int(self.og), len(self))
+
+        return {'plots': len(self),
+                'og_size': sum(compress(self.file_size, self.og)),
+                'portable_size': sum(compress(self.file_size, portable)),
+                'plots_og': _masked_counts(self.ksize, self.og, ksize_values),
+                'plots_portable': _masked_counts(self.ksize, portable, ksize_values),
+                # OG plots won't have a compression level
+                'plots_clevel': _masked_counts(self.clevel, portable, range(clevels))}
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+'''
+@author: Winter Snowfall
+@version: 3.50
+@date: 04/08/2025
+
+Warning: Built for use with python 3.6+
+'''
+
+from bisect import bisect_left
+from collections import OrderedDict
+
+class proof_stats:
+    '''per-harvester proof lookup histograms, built from the farming info sent for each signage point'''
+
+    # histogram bucket bounds, with chia warning about lookups that take longer than 8 seconds
+    LOOKUP_TIME_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30)
+    RESPONSE_TIME_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30)
+    PASSED_FILTER_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+    # arrival times are kept for a full sub-slot worth of signage points
+    _SIGNAGE_POINT_HISTORY = 64
+
+    def __init__(self):
+        # arrival time of recent signage points, keyed by signage point hash
+        self._signage_points = OrderedDict()
+
+        self.missing_signage_points = 0
+        # histograms and counters, keyed by harvester node id
+        self.harvesters = {}
+
+    @staticmethod
+    def _new_harvester():
+        # bucket counts aren't cumulative, with an extra bucket for anything above the largest bound
+        return {'lookup_time_buckets': [0] * (len(proof_stats.LOOKUP_TIME_BUCKETS) + 1),
+                'lookup_time_sum': 0,
+                'response_time_buckets': [0] * (len(proof_stats.RESPONSE_TIME_BUCKETS) + 1),
+                'response_time_sum': 0,
+                'response_time_count': 0,
+                'passed_filter_buckets': [0] * (len(proof_stats.PASSED_FILTER_BUCKETS) + 1),
+                'passed_filter_sum': 0,
+                'signage_points': 0,
+                'proofs': 0,
+                'total_plots': 0}
+
+    def record_signage_point(self, signage_point_hash, arrival_time, missing_signage_points):
+        self._signage_points[signage_point_hash] = arrival_time
+        if len(self._signage_points) > proof_stats._SIGNAGE_POINT_HISTORY:
+            self._signage_points.popitem(last=False)
+
+        # reported by the farmer as (timestamp, count), whenever signage points were skipped
+        if missing_signage_points is not None:
+            self.missing_signage_points += missing_signage_points[1]
+
+    def record_farming_info(self, farming_info, arrival_time):
+        harvester = self.harvesters.get(farming_info['node_id'])
+        if harvester is None:
+            harvester = proof_stats._new_harvester()
+            self.harvesters[farming_info['node_id']] = harvester
+
+        # lookup times are sent over in microseconds
+        lookup_time = farming_info['lookup_time'] / 1000000
+        harvester['lookup_time_buckets'][bisect_left(proof_stats.LOOKUP_TIME_BUCKETS, lookup_time)] += 1
+        harvester['lookup_time_sum'] += lookup_time
+        harvester['passed_filter_buckets'][bisect_left(proof_stats.PASSED_FILTER_BUCKETS, farming_info['passed_filter'])] += 1
+        harvester['passed_filter_sum'] += farming_info['passed_filter']
+        harvester['signage_points'] += 1
+        harvester['proofs'] += farming_info['proofs']
+        harvester['total_plots'] = farming_info['total_plots']
+
+        # the response time is measured from when the farmer announced the signage point
+        signage_point_time = self._signage_points.get(farming_info['signage_point'])
+        if signage_point_time is not None:
+            response_time = max(arrival_time - signage_point_time, 0)
+            harvester['response_time_buckets'][bisect_left(proof_stats.RESPONSE_TIME_BUCKETS, response_time)] += 1
+            harvester['response_time_sum'] += response_time
+            harvester['response_time_count'] += 1
+
+    def remove_harvester(self, node_id):
+        self.harvesters.pop(node_id, None)
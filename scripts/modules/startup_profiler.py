@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+'''
+@author: Winter Snowfall
+@version: 3.50
+@date: 04/08/2025
+
+Warning: Built for use with python 3.6+
+'''
+
+import importlib
+import time
+from contextlib import contextmanager
+
+class startup_profiler:
+    '''time the imports and initialization steps of chiatter components'''
+
+    def __init__(self):
+        # (component, step, seconds), in the order they happened
+        self.timings = []
+
+    def record(self, component, step, seconds):
+        self.timings.append((component, step, seconds))
+
+    @contextmanager
+    def measure(self, component, step):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(component, step, time.perf_counter() - start_time)
+
+    def import_modules(self, component, module_names):
+        # modules share a lot of their dependencies, so each import is
+        # only charged with whatever wasn't already imported before it
+        for module_name in module_names:
+            with self.measure(component, f'import {module_name}'):
+                importlib.import_module(module_name)
+
+    def report(self):
+        return [f'{component:<12} {step:<48} {seconds * 1000:>10.1f} ms' for component, step, seconds in self.timings]
+
+# shared by everything which runs during startup
+startup_profile = startup_profiler()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+'''
+@author: Winter Snowfall
+@version: 3.50
+@date: 04/08/2025
+
+Warning: Built for use with python 3.6+
+'''
+
+import math
+from array import array
+
+class history_tier:
+    '''fixed-size ring of samples at a single resolution, with per-second rates computed on insert'''
+
+    def __init__(self, name, step, capacity, series_count, downsampled):
+        self.name = name
+        self.step = step
+        self.capacity = capacity
+        self._series_count = series_count
+        # raw samples are stored as they come, otherwise they are averaged over step seconds
+        self._downsampled = downsampled
+
+        self._timestamps = array('d', [0.0]) * capacity
+        self._values = [array('d', [math.nan]) * capacity for _ in range(series_count)]
+        self._rates = [array('d', [math.nan]) * capacity for _ in range(series_count)]
+        # index of the next slot to be written, with count slots being in use
+        self._next = 0
+        self._count = 0
+
+        # the bucket currently being averaged, only used when downsampled
+        self._bucket = None
+        self._sums = array('d', [0.0]) * series_count
+        self._counts = array('l', [0]) * series_count
+
+    def add(self, timestamp, values):
+        if not self._downsampled:
+            self._append(timestamp, values)
+            return
+
+        bucket = int(timestamp // self.step)
+        if self._bucket is not None and bucket != self._bucket:
+            self._flush()
+        self._bucket = bucket
+
+        for index, value in enumerate(values):
+            if not math.isnan(value):
+                self._sums[index] += value
+                self._counts[index] += 1
+
+    def _flush(self):
+        averages = [self._sums[index] / self._counts[index] if self._counts[index] > 0 else math.nan
+                    for index in range(self._series_count)]
+        self._append(self._bucket * self.step, averages)
+
+        for index in range(self._series_count):
+            self._sums[index] = 0.0
+            self._counts[index] = 0
+
+    def _append(self, timestamp, values):
+        previous = (self._next - 1) % self.capacity
+
+        self._timestamps[self._next] = timestamp
+        for index, value in enumerate(values):
+            self._values[index][self._next] = value
+            # rates only need the previous slot, so they never get recomputed over the whole ring
+            if self._count > 0 and timestamp > self._timestamps[previous]:
+                self._rates[index][self._next] = ((value - self._values[index][previous]) /
+                                                  (timestamp - self._timestamps[previous]))
+            else:
+                self._rates[index][self._next] = math.nan
+
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def slots(self, since=None):
+        # slot indexes in chronological order, optionally skipping anything older than since
+        start = (self._next - self._count) % self.capacity
+        indexes = [(start + offset) % self.capacity for offset in range(self._count)]
+        if since is not None:
+            indexes = [index for index in indexes if self._timestamps[index] >= since]
+
+        return indexes
+
+    def timestamps(self, indexes):
+        return [self._timestamps[index] for index in indexes]
+
+    def values(self, series_index, indexes):
+        return [self._values[series_index][index] for index in indexes]
+
+    def rates(self, series_index, indexes):
+        return [self._rates[series_index][index] for index in indexes]
+
+    def to_dict(self):
+        indexes = self.slots()
+
+        return {'timestamps': self.timestamps(indexes),
+                'values': [self.values(series_index, indexes) for series_index in range(self._series_count)],
+                'bucket': self._bucket,
+                'sums': list(self._sums),
+                'counts': list(self._counts)}
+
+    def load_dict(self, data):
+        # rates get recomputed while the samples are being appended again
+        self._next = 0
+        self._count = 0
+        timestamps = data['timestamps'][-self.capacity:]
+        for position, timestamp in enumerate(timestamps, len(data['timestamps']) - len(timestamps)):
+            self._append(timestamp, [values[position] for values in data['values']])
+
+        self._bucket = data['bucket']
+        for index in range(self._series_count):
+            self._sums[index] = data['sums'][index]
+            self._counts[index] = data['counts'][index]
+
+class stats_history:
+    '''recent chia_stats values of a single node, kept at several resolutions within a fixed amount of memory'''
+
+    # chia_stats attributes worth keeping track of over time
+    SERIES = ('network_space_size', 'difficulty', 'current_height', 'og_time_to_win', 'portable_time_to_win',
+              'og_size', 'portable_size', 'harvesters', 'mempool_size', 'mempool_allocation',
+              'full_node_connections', 'chia_farmed', 'blocks_won', 'wallet_funds')
+    # (name, seconds per sample, seconds kept), with raw samples being taken every sample interval
+    RESOLUTIONS = (('raw', None, 3600), ('1m', 60, 86400), ('15m', 900, 2592000))
+
+    def __init__(self, sample_interval):
+        self._sample_interval = sample_interval
+        self._tiers = {}
+        for name, step, span in stats_history.RESOLUTIONS:
+            downsampled = step is not None
+            step = step if downsampled else sample_interval
+            self._tiers[name] = history_tier(name, step, span // step, len(stats_history.SERIES), downsampled)
+
+    def sample(self, chia_stats_inst, timestamp):
+        values = [float(getattr(chia_stats_inst, series)) for series in stats_history.SERIES]
+        for tier in self._tiers.values():
+            tier.add(timestamp, values)
+
+    def query(self, resolution, series=None, since=None):
+        # raises a KeyError for unknown resolutions, and a ValueError for unknown series
+        tier = self._tiers[resolution]
+        series = stats_history.SERIES if series is None else series
+        series_indexes = [stats_history.SERIES.index(series_name) for series_name in series]
+        indexes = tier.slots(since)
+
+        # NaN has no JSON representation, so gaps are returned as null
+        def json_safe(values):
+            return [None if math.isnan(value) else value for value in values]
+
+        return {'resolution': resolution,
+                'step': tier.step,
+                'timestamps': tier.timestamps(indexes),
+                'values': {series_name: json_safe(tier.values(series_index, indexes))
+                           for series_name, series_index in zip(series, series_indexes)},
+                'rates': {series_name: json_safe(tier.rates(series_index, indexes))
+                          for series_name, series_index in zip(series, series_indexes)}}
+
+    def to_dict(self):
+        return {'series': list(stats_history.SERIES),
+                'sample_interval': self._sample_interval,
+                'tiers': {name: tier.to_dict() for name, tier in self._tiers.items()}}
+
+    def load_dict(self, data):
+        # history taken with different series or resolutions can't be lined up with the current one
+        if data['series'] != list(stats_history.SERIES) or data['sample_interval'] != self._sample_interval:
+            return False
+
+        for name, tier in self._tiers.items():
+            tier.load_dict(data['tiers'][name])
+
+        return True